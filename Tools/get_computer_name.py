@@ -3,5 +3,13 @@ import socket
 def get_computer_name():
     return socket.gethostname()
 
+def get_info():
+    return {
+        "name": "get_computer_name",
+        "description": "Retrieves the computer name.",
+        "expected_params": [],
+        "freshness": "static"
+    }
+
 if __name__ == "__main__":
     print("Computer Name:", get_computer_name())
\ No newline at end of file
@@ -7,5 +7,13 @@ def get_cpu_info():
         "processor": platform.processor()
     }
 
+def get_info():
+    return {
+        "name": "get_cpu_info",
+        "description": "Retrieves information about the CPU.",
+        "expected_params": [],
+        "freshness": "static"
+    }
+
 if __name__ == "__main__":
     print("CPU Info:", get_cpu_info())
\ No newline at end of file
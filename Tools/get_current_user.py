@@ -3,5 +3,13 @@ import getpass
 def get_current_user():
     return getpass.getuser()
 
+def get_info():
+    return {
+        "name": "get_current_user",
+        "description": "Retrieves the current user.",
+        "expected_params": [],
+        "freshness": "static"
+    }
+
 if __name__ == "__main__":
     print("Current User:", get_current_user())
\ No newline at end of file
@@ -23,8 +23,18 @@ def get_gpu_info():
             return gpus if gpus else ["Unavailable"]
         else:
             return ["Unavailable"]
-    except Exception:
-        return ["Unavailable"]
+    except Exception as e:
+        # Raised, not returned, so a transient failure is not cached as the static answer.
+        raise RuntimeError(f"GPU query failed: {e}") from e
+
+def get_info():
+    return {
+        "name": "get_gpu_info",
+        "description": "Retrieves information about the GPU.",
+        "expected_params": [],
+        "freshness": "static",
+        "timeout": 10
+    }
 
 if __name__ == "__main__":
     print("GPU Info:", get_gpu_info())
\ No newline at end of file
@@ -3,8 +3,16 @@ import socket
 def get_ip_address():
     try:
         return socket.gethostbyname(socket.gethostname())
-    except Exception:
-        return "Unavailable"
+    except Exception as e:
+        raise RuntimeError(f"IP address lookup failed: {e}") from e
+
+def get_info():
+    return {
+        "name": "get_ip_address",
+        "description": "Retrieves the IP address.",
+        "expected_params": [],
+        "freshness": 300
+    }
 
 if __name__ == "__main__":
     print("IP Address:", get_ip_address())
\ No newline at end of file
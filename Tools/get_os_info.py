@@ -8,5 +8,13 @@ def get_os_info():
         "python_version": platform.python_version()
     }
 
+def get_info():
+    return {
+        "name": "get_os_info",
+        "description": "Retrieves information about the operating system.",
+        "expected_params": [],
+        "freshness": "static"
+    }
+
 if __name__ == "__main__":
     print("OS Info:", get_os_info())
\ No newline at end of file
@@ -9,6 +9,14 @@ def get_storage_info(path="/"):
         "free_gb": free / gb
     }
 
+def get_info():
+    return {
+        "name": "get_storage_info",
+        "description": "Retrieves information about the storage.",
+        "expected_params": ["path"],
+        "freshness": 30
+    }
+
 if __name__ == "__main__":
     storage = get_storage_info()
     print(f"Total Storage: {storage['total_gb']:.2f} GB")
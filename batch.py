@@ -0,0 +1,229 @@
+"""Batch entry point: runs saved turns from a JSONL file, several conversations at a time.
+
+Each input line is a JSON object with an `input` and, optionally, a `conversation_id`; lines with the same
+conversation id are turns of one conversation, run in file order with a shared history. Lines without one
+are single-turn conversations. Conversations run concurrently on `--workers` threads.
+
+Every finished turn is appended to the output JSONL at once, with its response, error, per-stage timings and
+token counts. Rerunning with the same output file resumes: finished turns are skipped and the histories of
+partly finished conversations are reloaded from the memory database. On Ctrl+C the running turns finish and
+are written before exit; a turn cut off by a hard kill runs again.
+
+Each conversation has its own planner context builder, and recall only searches its own session's messages
+and tool outputs, so a turn's planner input does not depend on the other conversations or the worker count.
+
+  python batch.py queries.jsonl results.jsonl [--workers 8] [--mock] [--mock-latency-ms 50]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import llm_client
+import memory
+import planner
+import responder
+import tracing
+from history_manager import ConversationHistory, PlannerContextBuilder
+from loader import build_registry, discover_tools
+from logger import log_event, init_log_db, shutdown_logger
+from memory import memory_store
+from pipeline import run_turn
+
+STAGES = ("route", "context", "plan", "optimize", "execute", "plan_execute", "respond", "turn")
+# Used with --mock for the planner and responder when the configured model names no known provider.
+MOCK_MODEL = "gpt-mock"
+
+
+def load_conversations(path: str):
+    """Returns {conversation_id: [input, ...]} in file order."""
+    conversations = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                user_input = str(record["input"]).strip()
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: expected a JSON object with an 'input': {e}") from e
+            conversation_id = str(record.get("conversation_id") or f"line-{line_number}")
+            conversations.setdefault(conversation_id, []).append(user_input)
+    return conversations
+
+def load_finished(path: str):
+    """Returns (run_id, {conversation_id: turns finished}) from an earlier, possibly interrupted, run.
+
+    A last line cut off by the interruption is removed so new records start on a line of their own.
+    """
+    run_id, finished = None, {}
+    if not os.path.exists(path):
+        return run_id, finished
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run_id = record.get("run_id", run_id)
+            conversation_id = record["conversation_id"]
+            finished[conversation_id] = max(finished.get(conversation_id, 0), record["turn"] + 1)
+    return run_id, finished
+
+
+def _timings(spans: list):
+    timings, tokens = {}, {"input": 0, "output": 0}
+    for span in spans:
+        if span.name in STAGES:
+            timings[span.name] = round(timings.get(span.name, 0.0) + span.wall_ms, 3)
+        tokens["input"] += span.input_tokens
+        tokens["output"] += span.output_tokens
+    return timings, tokens
+
+
+class BatchRunner:
+    def __init__(self, output_path: str, run_id: str, registry, available_tools: list):
+        self.output_path = output_path
+        self.run_id = run_id
+        self.registry = registry
+        self.available_tools = available_tools
+        self.records = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _write(self, record: dict):
+        with self._lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+            self.records.append(record)
+
+    def run_conversation(self, conversation_id: str, inputs: list, start: int):
+        session_id = f"batch-{self.run_id}-{conversation_id}"
+        history = ConversationHistory(session_id)
+        # Per conversation, as server.Session keeps one: the builder's cache holds one history's turns.
+        context_builder = PlannerContextBuilder()
+        for index in range(start, len(inputs)):
+            if self._stop.is_set():
+                return
+            started = time.perf_counter()
+            response, error = None, None
+            with tracing.collect() as spans:
+                try:
+                    response = run_turn(inputs[index], history, self.registry, self.available_tools,
+                                        source="batch", context_builder=context_builder, session_id=session_id)
+                except Exception as e:
+                    error = str(e)
+            timings, tokens = _timings(spans)
+            self._write({
+                "run_id": self.run_id, "conversation_id": conversation_id, "turn": index, "input": inputs[index],
+                "response": response, "error": error, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+                "timings_ms": timings, "tokens": tokens,
+            })
+
+    def run(self, conversations: dict, finished: dict, workers: int):
+        pending = {cid: inputs for cid, inputs in conversations.items() if finished.get(cid, 0) < len(inputs)}
+        pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch")
+        try:
+            futures = [pool.submit(self.run_conversation, cid, inputs, finished.get(cid, 0))
+                       for cid, inputs in pending.items()]
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            # On an interruption, let the running turns finish and be written, and start no new ones.
+            self._stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def summarize(records: list, elapsed: float, skipped: int):
+    """Aggregate throughput and latency of the turns run in this invocation."""
+    latencies = sorted(record["elapsed_ms"] for record in records)
+    report = {
+        "turns": len(records),
+        "skipped": skipped,
+        "errors": sum(1 for record in records if record["error"]),
+        "conversations": len({record["conversation_id"] for record in records}),
+        "elapsed_sec": round(elapsed, 3),
+        "turns_per_sec": round(len(records) / elapsed, 3) if elapsed > 0 else 0.0,
+        "input_tokens": sum(record["tokens"]["input"] for record in records),
+        "output_tokens": sum(record["tokens"]["output"] for record in records),
+        "stage_p50_ms": {},
+    }
+    if latencies:
+        report["turn_p50_ms"] = latencies[len(latencies) // 2]
+        report["turn_p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    for stage in STAGES:
+        values = sorted(record["timings_ms"][stage] for record in records if stage in record["timings_ms"])
+        if values:
+            report["stage_p50_ms"][stage] = values[len(values) // 2]
+    return report
+
+def print_report(report: dict):
+    print(f"{report['turns']} turns in {report['conversations']} conversations, {report['errors']} errors, "
+          f"{report['skipped']} skipped as already finished")
+    print(f"{report['elapsed_sec']:.2f} s, {report['turns_per_sec']:.2f} turns/s, "
+          f"tokens {report['input_tokens']}/{report['output_tokens']}")
+    if "turn_p50_ms" in report:
+        print(f"turn latency p50 {report['turn_p50_ms']:.1f} ms, p95 {report['turn_p95_ms']:.1f} ms")
+    for stage, value in report["stage_p50_ms"].items():
+        print(f"  {stage:13s} p50 {value:9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the turns of a JSONL file, several conversations at a time.")
+    parser.add_argument("input", help="JSONL file of {\"conversation_id\": ..., \"input\": ...} lines.")
+    parser.add_argument("output", help="JSONL results file; an existing one is resumed.")
+    parser.add_argument("--workers", type=int, default=4, help="Conversations run concurrently.")
+    parser.add_argument("--db", default=None, help="Memory database (default DB_PATH from config.json).")
+    parser.add_argument("--mock", action="store_true", help="Send LLM calls to a local mock of the providers.")
+    parser.add_argument("--mock-latency-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    conversations = load_conversations(args.input)
+    run_id, finished = load_finished(args.output)
+    run_id = run_id or uuid.uuid4().hex[:12]
+    skipped = sum(min(finished.get(cid, 0), len(inputs)) for cid, inputs in conversations.items())
+
+    if args.db:
+        memory_store.db_path = args.db
+    memory.init_db()
+    init_log_db()
+    mock = None
+    if args.mock:
+        from benchmarks.mock_llm import MockLLMServer
+        mock = MockLLMServer(latency_sec=args.mock_latency_ms / 1000).start()
+        for name, url in mock.provider_urls().items():
+            setattr(llm_client, name, url)
+        llm_client.OPENAI_API_KEY = llm_client.ANTHROPIC_API_KEY = llm_client.GOOGLE_API_KEY = "mock"
+        for module, name in ((planner, "PLANNER_MODEL"), (responder, "RESPONDER_MODEL")):
+            if llm_client._get_provider(getattr(module, name) or "") == "none":
+                setattr(module, name, MOCK_MODEL)
+
+    runner = BatchRunner(args.output, run_id, build_registry(), discover_tools())
+    print(f"run {run_id}: {sum(len(inputs) for inputs in conversations.values())} turns in {len(conversations)} "
+          f"conversations, {args.workers} workers{', mock providers' if mock else ''}")
+    start = time.perf_counter()
+    try:
+        runner.run(conversations, finished, args.workers)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with the same output file to resume.")
+        log_event("batch_interrupted", {"run_id": run_id})
+    finally:
+        report = summarize(runner.records, time.perf_counter() - start, skipped)
+        log_event("batch_complete", {"run_id": run_id, **report})
+        print_report(report)
+        memory_store.close()
+        shutdown_logger()
+        if mock is not None:
+            mock.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+"""Soak benchmark of conversation history memory over a long session.
+
+Appends turns with realistic plans, responses and tool results, and builds the planner context after each
+one, as every turn of a session does. Reports resident memory at checkpoints for the disk-backed
+ConversationHistory and, with --list, for the plain list main.py kept before. No LLM calls are made.
+
+Run from the repository root:
+  python -m benchmarks.bench_history [--turns 10000] [--result-kb 16] [--checkpoints 10] [--list]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+
+import logger
+import memory
+from history_manager import ConversationHistory, PlannerContextBuilder, Turn, build_context_for_planner
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def make_turn(index: int, result_kb: int):
+    return Turn(
+        user_input=f"Question number {index}: how is the disk on my computer doing?",
+        plan={"steps": [{"id": "s1", "type": "tool", "name": "get_storage_info", "params": {}},
+                        {"id": "s2", "type": "agent", "name": "computer_evaluation", "params": {"disk": "{s1}"},
+                         "depends_on": ["s1"]}]},
+        response=f"Answer number {index}. " * 20,
+        results={"initial_request": "", "s1": f"disk report {index} " + "x" * (result_kb * 1024),
+                 "s2": f"evaluation {index}"},
+    )
+
+
+def soak(history, turns: int, result_kb: int, checkpoints: int):
+    builder = PlannerContextBuilder()
+    every = max(1, turns // checkpoints)
+    samples = []
+    start = time.perf_counter()
+    for index in range(turns):
+        with memory.memory_store.turn():
+            build_context_for_planner(history, f"Follow-up question {index}", context_builder=builder)
+            history.append(make_turn(index, result_kb))
+        if (index + 1) % every == 0:
+            gc.collect()
+            samples.append((index + 1, rss_mb(), time.perf_counter() - start))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--result-kb", type=int, default=16, help="Size of each turn's tool result.")
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--list", action="store_true", help="Keep history in a plain list, as main.py used to.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        memory.memory_store.db_path = os.path.join(tmp, "memory.db")
+        memory.init_db()
+        history = [] if args.list else ConversationHistory("soak")
+        baseline = rss_mb()
+        print(f"{'list' if args.list else 'ConversationHistory'}: {args.turns} turns, {args.result_kb} KB results, "
+              f"start RSS {baseline:.1f} MB")
+        print(f"{'turns':>8s} {'RSS MB':>9s} {'growth MB':>10s} {'turns/s':>9s}")
+        samples = soak(history, args.turns, args.result_kb, args.checkpoints)
+        for turns, rss, elapsed in samples:
+            print(f"{turns:8d} {rss:9.1f} {rss - baseline:10.1f} {turns / elapsed:9.0f}")
+        half = samples[len(samples) // 2]
+        print(f"\nRSS growth over the second half: {samples[-1][1] - half[1]:.1f} MB "
+              f"across {samples[-1][0] - half[0]} turns")
+
+        logger.shutdown_logger()
+        memory.memory_store.close()
+    return samples
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
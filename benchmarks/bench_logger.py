@@ -0,0 +1,60 @@
+"""Compares per-event connect/commit logging with the background batched writer.
+
+Run from the repository root:  python -m benchmarks.bench_logger [events]
+"""
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import logger
+
+
+def log_event_per_connection(db_file: str, kind: str, payload: dict):
+    """The previous log_event: one connection and one commit per event."""
+    log_entry = (datetime.datetime.utcnow().isoformat(), kind, json.dumps(payload))
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(
+            f"INSERT INTO {logger.LOG_TABLE_NAME} (timestamp, kind, payload) VALUES (?, ?, ?)",
+            log_entry
+        )
+        conn.commit()
+
+
+def main(events: int = 2000):
+    payload = {"model": "gpt-4o", "usage": {"prompt_tokens": 812, "completion_tokens": 133}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        logger.init_log_db()
+
+        start = time.perf_counter()
+        for _ in range(events):
+            log_event_per_connection(logger.DB_FILE, "bench_per_connection", payload)
+        per_connection = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(events):
+            logger.log_event("bench_batched", payload)
+        enqueue = time.perf_counter() - start
+        logger.flush_logs(timeout=60)
+        batched = time.perf_counter() - start
+        logger.shutdown_logger()
+
+        with sqlite3.connect(logger.DB_FILE) as conn:
+            written = conn.execute(
+                f"SELECT COUNT(*) FROM {logger.LOG_TABLE_NAME} WHERE kind = 'bench_batched'"
+            ).fetchone()[0]
+
+    print(f"events:                         {events}")
+    print(f"per-event connect/commit:       {per_connection * 1e6 / events:9.1f} us/event")
+    print(f"batched writer, caller cost:    {enqueue * 1e6 / events:9.1f} us/event")
+    print(f"batched writer, until on disk:  {batched * 1e6 / events:9.1f} us/event")
+    print(f"batched events written:         {written}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,106 @@
+"""Offline benchmark of filling step params and building prompts from multi-megabyte step results.
+
+Runs the same plan through the previous path (a regex pass over every param string per step, results
+copied into params with `str()`, the whole thing dumped into each agent prompt and again into the
+responder prompt) and the compiled one (step_params: templates compiled once, results passed as handles
+and rendered once per run, capped at PROMPT_RESULT_MAX_CHARS). Reports time, peak traced memory and the
+characters of prompt text built for each. No LLM calls are made.
+
+Run from the repository root:
+  python -m benchmarks.bench_params [--result-mb 4] [--agents 4] [--iterations 5]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import tracemalloc
+
+from step_params import compile_params, params_to_prompt, render_result
+
+
+def build_case(result_mb: float, agents: int):
+    size = int(result_mb * 1_000_000)
+    results = {
+        "initial_request": "Summarize the logs and the process table.",
+        "logs": "2024-01-01 12:00:00 INFO service started\n" * (size // 41),
+        "processes": {"rows": [{"pid": pid, "name": f"proc-{pid}", "cpu": 0.1} for pid in range(size // 45)]},
+    }
+    steps = [{"id": "logs", "type": "tool", "name": "read_logs", "params": {}},
+             {"id": "processes", "type": "tool", "name": "list_processes", "params": {}}]
+    steps += [{"id": f"a{i}", "type": "agent", "name": "analyst", "depends_on": ["logs", "processes"],
+               "params": {"question": f"aspect {i} of {{initial_request}}", "logs": "{logs}",
+                          "context": "Process table: {processes}"}}
+              for i in range(agents)]
+    return {"steps": steps}, results
+
+
+def legacy_substitute(params, results: dict):
+    """The per-step substitution the executor used before step_params."""
+    if isinstance(params, dict):
+        return {k: legacy_substitute(v, results) for k, v in params.items()}
+    if isinstance(params, list):
+        return [legacy_substitute(item, results) for item in params]
+    if isinstance(params, str):
+        match = re.fullmatch(r"\{([a-zA-Z0-9_]+)\}", params)
+        if match:
+            return results.get(match.group(1), params)
+        return re.sub(r"\{([a-zA-Z0-9_]+)\}", lambda m: str(results.get(m.group(1), m.group(0))), params)
+    return params
+
+
+def run_legacy(plan: dict, results: dict):
+    chars = 0
+    for step in plan["steps"]:
+        params = legacy_substitute(step.get("params", {}), results)
+        if step["type"] == "agent":
+            chars += len(f"Execute the task with the following parameters:\n{json.dumps(params, indent=2)}")
+    chars += len("\n".join(f"- Step {step}: {result}" for step, result in results.items()))
+    return chars
+
+
+def run_compiled(plan: dict, results: dict):
+    chars = 0
+    handles = {}
+    compiled = {step["id"]: compile_params(step.get("params", {})) for step in plan["steps"]}
+    for step in plan["steps"]:
+        if step["type"] == "agent":
+            params = compiled[step["id"]].render(results, handles)
+            chars += len(f"Execute the task with the following parameters:\n{params_to_prompt(params)}")
+        else:
+            compiled[step["id"]].render(results)
+    chars += len("\n".join(f"- Step {step}: {render_result(result)}" for step, result in results.items()))
+    return chars
+
+
+def measure(fn, plan: dict, results: dict, iterations: int):
+    timings, peaks, chars = [], [], 0
+    for _ in range(iterations):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chars = fn(plan, results)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"ms": 1000 * sorted(timings)[len(timings) // 2], "peak_mb": max(peaks) / 1e6, "prompt_chars": chars}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--result-mb", type=float, default=4.0, help="Size of each large step result.")
+    parser.add_argument("--agents", type=int, default=4, help="Agent steps reading both results.")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    plan, results = build_case(args.result_mb, args.agents)
+    print(f"2 results of ~{args.result_mb:.1f} MB, {args.agents} agents reading both, {args.iterations} iterations")
+    print(f"{'path':10s} {'p50 ms':>10s} {'peak MB':>10s} {'prompt chars':>14s}")
+    report = {}
+    for name, fn in (("legacy", run_legacy), ("compiled", run_compiled)):
+        report[name] = measure(fn, plan, results, args.iterations)
+        print(f"{name:10s} {report[name]['ms']:10.1f} {report[name]['peak_mb']:10.1f} {report[name]['prompt_chars']:14d}")
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,253 @@
+"""Offline benchmark of the turn pipeline against the mock providers.
+
+Drives build_context_for_planner, plan_with_retry, optimize_plan, execute_plan and generate_final_response
+for each scenario and provider, and reports p50/p95/p99 latency per stage plus turn throughput and LLM calls
+per turn. Results can be saved as a baseline; later runs flag stages whose p95 regressed beyond the tolerance.
+
+Run from the repository root:
+  python -m benchmarks.bench_pipeline [--iterations 20] [--latency-ms 20] [--response-chars 400]
+                                      [--providers openai anthropic google] [--scenarios ...]
+                                      [--output-chars-per-sec 400] [--pipelined] [--no-optimize]
+                                      [--baseline benchmarks/baseline.json] [--save-baseline]
+
+--pipelined streams the plan and dispatches steps as they arrive (PIPELINED_PLANNING), so planning and
+execution are reported together as plan_execute. Pair it with --output-chars-per-sec to model the planner's
+generation time, which is what the pipelined mode overlaps. Streamed plans are not optimized; --no-optimize
+runs the other plans as written.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import executor
+import llm_client
+import logger
+import memory
+import planner
+import responder
+from benchmarks.mock_llm import MockLLMServer
+from history_manager import PlannerContextBuilder, Turn, build_context_for_planner
+from loader import AGENTS_DIR, Registry, discover_tools
+from plan_optimizer import optimize_plan
+
+PROVIDER_MODELS = {"openai": "gpt-bench", "anthropic": "claude-bench", "google": "gemini-bench"}
+STAGES = ("context", "plan", "execute", "plan_execute", "respond_ttft", "respond", "turn")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+AGENT = "computer_evaluation"
+
+BENCH_TOOL = '''def bench_payload(size=16, tag=""):
+    return tag + "x" * int(size)
+
+def get_info():
+    return {
+        "name": "bench_payload",
+        "description": "Returns a payload of the requested size.",
+        "expected_params": ["size", "tag"],
+        "freshness": "never"
+    }
+'''
+
+
+def _tool(step_id: str, size: int, tag: str = ""):
+    return {"id": step_id, "type": "tool", "name": "bench_payload", "params": {"size": size, "tag": tag or step_id}}
+
+
+def _agent(step_id: str, params: dict, depends_on: list = None):
+    return {"id": step_id, "type": "agent", "name": AGENT, "params": params, "depends_on": depends_on or []}
+
+
+def build_scenarios():
+    fanout_tools = [_tool(f"t{i}", 256) for i in range(12)]
+    fanout_agents = [_agent(f"a{i}", {"question": f"part {i}", "data": f"{{t{i}}}"}, [f"t{i}"]) for i in range(4)]
+    summary = _agent("s", {"parts": [f"{{a{i}}}" for i in range(4)]}, [f"a{i}" for i in range(4)])
+    chain = [_agent("c0", {"question": "start"})]
+    chain += [_agent(f"c{i}", {"previous": f"{{c{i - 1}}}"}, [f"c{i - 1}"]) for i in range(1, 8)]
+    large = [_tool("big1", 1_000_000), _tool("big2", 1_000_000),
+             _agent("a1", {"first": "{big1}", "second": "{big2}"}, ["big1", "big2"])]
+    # Repeated tool calls and independent questions to the same agent, as planners often produce.
+    redundant = [_tool("os", 256, "os"), _tool("os_again", 256, "os"), _tool("cpu", 256, "cpu")]
+    redundant += [_agent(f"q{i}", {"question": f"aspect {i}", "os": "{os_again}", "cpu": "{cpu}"}, ["os_again", "cpu"])
+                  for i in range(4)]
+    redundant += [_agent("summary", {"parts": [f"{{q{i}}}" for i in range(4)]}, [f"q{i}" for i in range(4)])]
+    return {
+        "empty_plan": {"plan": {"steps": []}},
+        "wide_fanout": {"plan": {"steps": fanout_tools + fanout_agents + [summary]}},
+        "deep_chain": {"plan": {"steps": chain}},
+        "large_tool_output": {"plan": {"steps": large}},
+        "long_history": {"plan": {"steps": [_tool("t1", 256)]}, "history_turns": 200},
+        "redundant_plan": {"plan": {"steps": redundant}},
+    }
+
+
+def make_history(turns: int):
+    history = []
+    for index in range(turns):
+        history.append(Turn(
+            user_input=f"Earlier question number {index} about my computer?",
+            plan={"steps": [_tool("t1", 64)]},
+            response=f"Earlier answer number {index}. " * 8,
+            results={"initial_request": "", "t1": "x" * 2048},
+        ))
+    return history
+
+
+def percentile(values: list, pct: float):
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run_scenario(mock, registry, scenario: dict, model: str, iterations: int, pipelined: bool = False,
+                 optimize: bool = True):
+    mock.plan = scenario["plan"]
+    planner.PLANNER_MODEL = responder.RESPONDER_MODEL = model
+    history = make_history(scenario.get("history_turns", 0))
+    context_builder = PlannerContextBuilder(provider=llm_client._get_provider(model))
+    agents = registry.list_agents()
+    tools = discover_tools(registry.tools_dir, manifest_path=None)
+    stages = [stage for stage in STAGES if stage not in (("plan", "execute") if pipelined else ())]
+    timings = {stage: [] for stage in stages}
+
+    llm_calls = 0
+    start_all = time.perf_counter()
+    for index in range(iterations):
+        requests_before = mock.requests
+        user_input = f"Benchmark request {index}: can my computer run this game?"
+        turn_start = time.perf_counter()
+
+        start = time.perf_counter()
+        planner_input = build_context_for_planner(history, user_input, context_builder=context_builder)
+        timings["context"].append(time.perf_counter() - start)
+
+        if pipelined:
+            start = time.perf_counter()
+            plan, results = executor.execute_streamed_plan(
+                lambda on_step: planner.stream_plan(planner_input, agents, tools, on_step),
+                user_input=planner_input, registry=registry
+            )
+            timings["plan_execute"].append(time.perf_counter() - start)
+        else:
+            start = time.perf_counter()
+            plan = planner.plan_with_retry(planner_input, agents, tools)
+            if optimize:
+                # Fuses as if the agent had opted in with "fuse": true.
+                plan = optimize_plan(plan, fuse_agents={AGENT})[0]
+            timings["plan"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            results = executor.execute_plan(plan, user_input=planner_input, registry=registry)
+            timings["execute"].append(time.perf_counter() - start)
+            timings["plan_execute"].append(timings["plan"][-1] + timings["execute"][-1])
+
+        first_delta = []
+        start = time.perf_counter()
+        response = responder.generate_final_response(
+            plan, results, user_input,
+            on_delta=lambda text: first_delta or first_delta.append(time.perf_counter())
+        )
+        end = time.perf_counter()
+        timings["respond"].append(end - start)
+        timings["respond_ttft"].append((first_delta[0] if first_delta else end) - start)
+        timings["turn"].append(end - turn_start)
+        llm_calls += mock.requests - requests_before
+
+        if history:
+            history.append(Turn(user_input, plan, response, results))
+    elapsed = time.perf_counter() - start_all
+
+    stats = {}
+    for stage, values in timings.items():
+        stats[stage] = {f"p{pct}": round(percentile(values, pct) * 1000, 3) for pct in (50, 95, 99)}
+    stats["throughput_turns_per_sec"] = round(iterations / elapsed, 3)
+    stats["llm_calls_per_turn"] = round(llm_calls / iterations, 2)
+    return stats
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for key, stats in results.items():
+        for stage in STAGES:
+            if stage not in stats:
+                continue
+            old = baseline.get(key, {}).get(stage, {}).get("p95")
+            new = stats[stage]["p95"]
+            # Ignore sub-millisecond noise.
+            if old is not None and new > old * (1 + tolerance) and new - old > 1.0:
+                regressions.append(f"{key} {stage}: p95 {old:.2f} ms -> {new:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    scenarios = build_scenarios()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--response-chars", type=int, default=400)
+    parser.add_argument("--providers", nargs="+", choices=sorted(PROVIDER_MODELS), default=sorted(PROVIDER_MODELS))
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(scenarios), default=list(scenarios))
+    parser.add_argument("--output-chars-per-sec", type=float, default=0, help="Mock generation rate; 0 is instant.")
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--no-optimize", action="store_true", help="Execute plans as written, without plan_optimizer.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth before flagging a regression.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory.memory_store.db_path = os.path.join(tmp, "memory.db")
+        memory.init_db()
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        llm_client.LLM_CACHE_ENABLED = False
+        llm_client.GOOGLE_API_KEY = "bench"
+
+        tools_dir = os.path.join(tmp, "BenchTools")
+        os.makedirs(tools_dir)
+        with open(os.path.join(tools_dir, "bench_payload.py"), "w", encoding="utf-8") as f:
+            f.write(BENCH_TOOL)
+        registry = Registry(agents_dir=AGENTS_DIR, tools_dir=tools_dir)
+
+        mock = MockLLMServer(latency_sec=args.latency_ms / 1000, response_chars=args.response_chars,
+                             chars_per_sec=args.output_chars_per_sec).start()
+        for name, url in mock.provider_urls().items():
+            setattr(llm_client, name, url)
+
+        print(f"mock latency {args.latency_ms:.0f} ms, response {args.response_chars} chars, "
+              f"{args.iterations} iterations per scenario (times in ms)")
+        print(f"{'scenario/provider':34s} {'stage':13s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+        results = {}
+        for scenario_name in args.scenarios:
+            for provider in args.providers:
+                key = f"{scenario_name}/{provider}"
+                stats = results[key] = run_scenario(mock, registry, scenarios[scenario_name],
+                                                    PROVIDER_MODELS[provider], args.iterations, args.pipelined,
+                                                    not args.no_optimize)
+                for stage in STAGES:
+                    if stage not in stats:
+                        continue
+                    print(f"{key:34s} {stage:13s} {stats[stage]['p50']:9.2f} {stats[stage]['p95']:9.2f} "
+                          f"{stats[stage]['p99']:9.2f}")
+                print(f"{key:34s} {'throughput':13s} {stats['throughput_turns_per_sec']:9.2f} turns/s, "
+                      f"{stats['llm_calls_per_turn']:.2f} LLM calls/turn")
+
+        memory.memory_store.close()
+        logger.shutdown_logger()
+        mock.shutdown()
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\nRegressions against baseline:" if regressions else "\nNo regressions against baseline.")
+        for line in regressions:
+            print(f"  {line}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+"""Offline benchmark of planner output handling against the mock providers.
+
+Feeds plan_with_retry the kinds of malformed output models produce (markdown fences, prose around the
+JSON, trailing commas, missing depends_on, unknown names, truncation) and reports how many planner calls
+each plan took, next to the calls the previous strict `json.loads` parsing would have needed.
+
+Run from the repository root:
+  python -m benchmarks.bench_planner [--latency-ms 20] [--providers openai anthropic google]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import llm_client
+import logger
+import planner
+from benchmarks.mock_llm import MockLLMServer
+from loader import AGENTS_DIR, Registry
+
+PROVIDER_MODELS = {"openai": "gpt-bench", "anthropic": "claude-bench", "google": "gemini-bench"}
+
+PLAN = {"steps": [
+    {"id": "s1", "type": "tool", "name": "get_os_info", "params": {}},
+    {"id": "s2", "type": "tool", "name": "get_cpu_info", "params": {}},
+    {"id": "s3", "type": "agent", "name": "computer_evaluation",
+     "params": {"os": "{s1}", "cpu": "{s2}", "question": "Can it run the game?"}, "depends_on": ["s1", "s2"]},
+]}
+
+
+def build_cases():
+    clean = json.dumps(PLAN, indent=2)
+    no_deps = json.loads(clean)
+    del no_deps["steps"][2]["depends_on"]
+    unknown = json.loads(clean)
+    unknown["steps"][1]["name"] = "get_cpu_details"
+    return {
+        "clean": [clean],
+        "fenced": ["```json\n" + clean + "\n```"],
+        "prose": ["Here is the plan:\n" + clean + "\nThis covers the request."],
+        "trailing_comma": [clean.replace('"params": {}', '"params": {},', 1).replace('"s2"\n', '"s2",\n')],
+        "missing_depends_on": [json.dumps(no_deps)],
+        "unknown_tool": [json.dumps(unknown), clean],
+        "truncated": [clean[:len(clean) // 2], clean],
+    }
+
+def strict_calls(texts: list):
+    """Calls the strict parser needed: it retried anything `json.loads` rejected and accepted anything else.
+
+    The mock repeats a case's last response, so a case the strict parser never accepts used every retry.
+    """
+    for index, text in enumerate(texts):
+        try:
+            if isinstance(json.loads(text).get("steps"), list):
+                return index + 1
+        except ValueError:
+            pass
+    return planner.MAX_RETRIES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--providers", nargs="+", choices=sorted(PROVIDER_MODELS), default=sorted(PROVIDER_MODELS))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        llm_client.LLM_CACHE_ENABLED = False
+        llm_client.GOOGLE_API_KEY = "bench"
+        agents = Registry(agents_dir=AGENTS_DIR).list_agents()
+
+        mock = MockLLMServer(latency_sec=args.latency_ms / 1000).start()
+        for name, url in mock.provider_urls().items():
+            setattr(llm_client, name, url)
+
+        print(f"mock latency {args.latency_ms:.0f} ms, MAX_RETRIES {planner.MAX_RETRIES}")
+        print(f"{'case/provider':30s} {'calls':>6s} {'strict':>7s} {'ms':>8s}  result")
+        totals = {"calls": 0, "strict": 0, "plans": 0}
+        for case, texts in build_cases().items():
+            expected = strict_calls(texts)
+            for provider in args.providers:
+                planner.PLANNER_MODEL = PROVIDER_MODELS[provider]
+                mock.planner_texts = list(texts)
+                mock.planner_text = texts[-1]
+                before = mock.requests
+                start = time.perf_counter()
+                try:
+                    plan = planner.plan_with_retry(f"Benchmark request: {case}", agents, [])
+                    outcome = f"{len(plan['steps'])} steps"
+                except Exception as e:
+                    outcome = f"FAILED: {str(e)[:60]}"
+                elapsed = (time.perf_counter() - start) * 1000
+                calls = mock.requests - before
+                totals["calls"] += calls
+                totals["strict"] += expected
+                totals["plans"] += 1
+                print(f"{case + '/' + provider:30s} {calls:6d} {expected:7d} {elapsed:8.1f}  {outcome}")
+        print(f"\nplanner calls per plan: {totals['calls'] / totals['plans']:.2f} "
+              f"(strict parsing: {totals['strict'] / totals['plans']:.2f})")
+
+        logger.shutdown_logger()
+        mock.shutdown()
+    return totals
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
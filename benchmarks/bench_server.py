@@ -0,0 +1,81 @@
+"""Load test for server mode against the local mock LLM.
+
+Each concurrency level runs that many sessions in parallel, each sending turns one after another,
+and reports turns per second. Run from the repository root:  python -m benchmarks.bench_server
+"""
+import asyncio
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import llm_client
+import logger
+import memory
+import planner
+import responder
+from benchmarks.mock_llm import MockLLMServer
+from loader import build_registry
+from server import AgentServer
+
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16)
+MODEL = "gpt-mock"
+
+
+def start_server(server: AgentServer):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-server", daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    return loop
+
+
+def client_session(port: int, turns: int):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("POST", "/sessions")
+    session_id = json.loads(conn.getresponse().read())["session_id"]
+    for index in range(turns):
+        conn.request("POST", f"/sessions/{session_id}/turns", body=json.dumps({"input": f"Question {index}"}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        payload = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(payload)
+    conn.close()
+
+
+def main(turns_per_session: int = 5, latency_sec: float = 0.05):
+    with tempfile.TemporaryDirectory() as tmp:
+        memory.memory_store.db_path = os.path.join(tmp, "memory.db")
+        memory.init_db()
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        mock = MockLLMServer(latency_sec=latency_sec).start()
+        for name, url in mock.provider_urls().items():
+            setattr(llm_client, name, url)
+        planner.PLANNER_MODEL = responder.RESPONDER_MODEL = MODEL
+
+        server = AgentServer(host="127.0.0.1", port=0, registry=build_registry(), available_tools=[])
+        start_server(server)
+
+        print(f"mock LLM latency: {latency_sec * 1000:.0f} ms, turns per session: {turns_per_session}")
+        for sessions in CONCURRENCY_LEVELS:
+            threads = [threading.Thread(target=client_session, args=(server.port, turns_per_session))
+                       for _ in range(sessions)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            total = sessions * turns_per_session
+            print(f"sessions={sessions:3d}  turns={total:4d}  {elapsed:6.2f}s  {total / elapsed:7.1f} turns/s")
+
+        memory.memory_store.close()
+        logger.shutdown_logger()
+        mock.shutdown()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
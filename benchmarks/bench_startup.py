@@ -0,0 +1,73 @@
+"""Measures tool discovery at startup with and without the tool manifest cache.
+
+Run from the repository root:  python -m benchmarks.bench_startup [tools]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import loader
+
+SYNTHETIC_TOOL = '''import json
+import decimal
+
+_LOOKUP = {{i: decimal.Decimal(i) ** 2 for i in range(2000)}}
+
+def {name}(value=""):
+    return json.dumps({{"tool": "{name}", "value": value}})
+
+def get_info():
+    return {{
+        "name": "{name}",
+        "description": "Synthetic benchmark tool {index}.",
+        "expected_params": ["value"],
+        "freshness": "never"
+    }}
+'''
+
+
+def write_tools(tools_dir: str, count: int):
+    os.makedirs(tools_dir)
+    with open(os.path.join(tools_dir, "__init__.py"), "w", encoding="utf-8"):
+        pass
+    for index in range(count):
+        name = f"synthetic_tool_{index:04d}"
+        with open(os.path.join(tools_dir, f"{name}.py"), "w", encoding="utf-8") as f:
+            f.write(SYNTHETIC_TOOL.format(name=name, index=index))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(count: int = 500):
+    with tempfile.TemporaryDirectory() as tmp:
+        tools_dir = os.path.join(tmp, "BenchTools")
+        manifest_path = os.path.join(tmp, "tool_manifest.json")
+        write_tools(tools_dir, count)
+
+        no_cache, tools = timed(lambda: loader.discover_tools(tools_dir, manifest_path=None))
+        cold, _ = timed(lambda: loader.discover_tools(tools_dir, manifest_path=manifest_path))
+        warm, warm_tools = timed(lambda: loader.discover_tools(tools_dir, manifest_path=manifest_path))
+
+        os.utime(os.path.join(tools_dir, "synthetic_tool_0000.py"))
+        one_changed, _ = timed(lambda: loader.discover_tools(tools_dir, manifest_path=manifest_path))
+
+        registry = loader.Registry(tools_dir=tools_dir)
+        first_call, _ = timed(lambda: registry.get_tool("synthetic_tool_0001")[0]("x"))
+        modules_loaded = sum(1 for name in sys.modules if name.startswith("BenchTools."))
+
+    print(f"tools:                               {count} (found {len(tools)}, {len(warm_tools)} from manifest)")
+    print(f"import every tool (no manifest):     {no_cache * 1000:8.1f} ms")
+    print(f"first start, writing manifest:       {cold * 1000:8.1f} ms")
+    print(f"warm start from manifest:            {warm * 1000:8.1f} ms")
+    print(f"warm start, one tool changed:        {one_changed * 1000:8.1f} ms")
+    print(f"lazy import on first tool call:      {first_call * 1000:8.1f} ms")
+    print(f"tool modules loaded by the registry: {modules_loaded}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
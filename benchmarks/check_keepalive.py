@@ -0,0 +1,56 @@
+"""Checks that llm_client reuses one keep-alive connection across sequential calls to the mock providers.
+
+Makes `--calls` plain and streamed calls per provider, one after another, and fails unless the mock saw a
+single TCP connection for all of them.
+
+Run from the repository root:
+  python -m benchmarks.check_keepalive [--calls 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import llm_client
+import logger
+from benchmarks.mock_llm import MockLLMServer
+
+PROVIDER_MODELS = {"openai": "gpt-bench", "anthropic": "claude-bench", "google": "gemini-bench"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.DB_FILE = os.path.join(tmp, "data", "application.db")
+        llm_client.LLM_CACHE_ENABLED = False
+        llm_client.GOOGLE_API_KEY = "bench"
+        mock = MockLLMServer(latency_sec=0).start()
+        for name, url in mock.provider_urls().items():
+            setattr(llm_client, name, url)
+
+        messages = [{"role": "user", "content": "ping"}]
+        calls = 0
+        for model in PROVIDER_MODELS.values():
+            for _ in range(args.calls):
+                response = llm_client.chat_completion(model, messages, temperature=0.5)
+                streamed = list(llm_client.chat_completion_stream(model, messages, temperature=0.5))
+                if isinstance(response, dict) or any(isinstance(delta, dict) for delta in streamed):
+                    print(f"FAILED: {model} returned an error: {response}")
+                    return 1
+                calls += 2
+
+        print(f"{calls} calls, {mock.requests} requests, {mock.connections} TCP connection(s)")
+        logger.shutdown_logger()
+        mock.shutdown()
+    if mock.connections != 1:
+        print("FAILED: expected every call to reuse one connection")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,257 @@
+"""Local stand-in for the LLM providers, for benchmarks and offline runs.
+
+Speaks the wire formats llm_client targets, chosen by request path:
+  OpenAI     POST .../chat/completions
+  Anthropic  POST .../messages
+  Gemini     POST .../models/{model}:generateContent  (and :streamGenerateContent?alt=sse)
+Streaming requests are answered with server-sent events. Planner requests (recognized by the
+planner's system prompt) get `plan` back as JSON, or verbatim the next of the queued `planner_texts`, else
+`planner_text`. Fused agent requests get a JSON object with `response_chars` characters of text per task;
+every other request gets `response_chars` characters of text. An Anthropic assistant
+prefill is taken as the start of the answer, and anything the answer had before it is dropped. Every
+response is delayed by `latency_sec`; with `chars_per_sec` set, text is also generated at that rate, chunk
+by chunk when streaming.
+
+Degradation can be injected: `failing` maps a provider name to an HTTP status returned for all of its
+requests (with `retry_after` as the Retry-After header), and every `slow_every`-th request waits an extra
+`slow_sec`.
+
+Prompt caching is imitated: once a request's leading prompt (the Anthropic system blocks marked with
+`cache_control`, or the first message for OpenAI and Gemini, which cache automatically) of at least
+`cache_min_tokens` has been seen, later requests starting with it report those tokens as cache reads.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_PLAN = {"steps": [{"id": "s1", "type": "tool", "name": "get_os_info", "params": {}}]}
+STREAM_CHUNK_CHARS = 16
+# Fused agent calls (executor.FUSED_TASKS_HEADER) are answered with one answer per task id.
+FUSED_MARKER = "maps every task id"
+CACHE_MIN_TOKENS = 1024
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_sec: float = 0.05, plan: dict = None,
+                 response_chars: int = 24, chars_per_sec: float = 0, cache_min_tokens: int = CACHE_MIN_TOKENS):
+        super().__init__((host, port), _MockHandler)
+        self.latency_sec = latency_sec
+        self.plan = plan if plan is not None else DEFAULT_PLAN
+        self.planner_text = None
+        self.planner_texts = []
+        self.response_chars = response_chars
+        self.chars_per_sec = chars_per_sec
+        self.failing = {}
+        self.retry_after = None
+        self.slow_every = 0
+        self.slow_sec = 0.0
+        self.requests = 0
+        self.connections = 0
+        self.cache_min_tokens = cache_min_tokens
+        self._cached_prefixes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def provider_urls(self):
+        """URLs to assign to llm_client's OPENAI_API_URL, ANTHROPIC_API_URL and GOOGLE_API_URL."""
+        return {
+            "OPENAI_API_URL": f"{self.base_url}/v1/chat/completions",
+            "ANTHROPIC_API_URL": f"{self.base_url}/v1/messages",
+            "GOOGLE_API_URL": f"{self.base_url}/v1beta/models/{{model}}:generateContent",
+        }
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True).start()
+        return self
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle + delayed ACK add ~40 ms per response.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"
+        request = json.loads(raw_body)
+        with self.server._lock:
+            self.server.requests += 1
+            slow = self.server.slow_every and self.server.requests % self.server.slow_every == 0
+        time.sleep(self.server.latency_sec + (self.server.slow_sec if slow else 0))
+
+        if "master planner" in raw_body.decode("utf-8"):
+            with self.server._lock:
+                queued = self.server.planner_texts.pop(0) if self.server.planner_texts else None
+            text = queued if queued is not None else self.server.planner_text
+            if text is None:
+                text = json.dumps(self.server.plan)
+        elif FUSED_MARKER in raw_body.decode("utf-8"):
+            answer = ("This is a mock response. " * (self.server.response_chars // 25 + 1))[:self.server.response_chars]
+            text = json.dumps({task_id: answer for task_id in _fused_task_ids(request)})
+        else:
+            text = ("This is a mock response. " * (self.server.response_chars // 25 + 1))[:self.server.response_chars]
+
+        path = self.path.split("?", 1)[0]
+        provider = "google" if ":" in path else "anthropic" if path.endswith("/messages") else "openai"
+        if provider in self.server.failing:
+            self._send_error(self.server.failing[provider])
+            return
+        usage = self._prompt_usage(provider, request)
+        messages = request.get("messages") or []
+        if provider == "anthropic" and messages and messages[-1].get("role") == "assistant":
+            prefill = messages[-1]["content"]
+            text = text[text.index(prefill) + len(prefill):] if prefill in text else text
+        streaming = ":streamGenerateContent" in path or request.get("stream")
+        if self.server.chars_per_sec and not streaming:
+            time.sleep(len(text) / self.server.chars_per_sec)
+        if ":streamGenerateContent" in path:
+            self._send_stream("google", text, usage)
+        elif ":generateContent" in path:
+            self._send_json(_google_body(text, usage))
+        elif path.endswith("/messages"):
+            if request.get("stream"):
+                self._send_stream("anthropic", text, usage)
+            else:
+                self._send_json(_anthropic_body(text, usage))
+        elif request.get("stream"):
+            self._send_stream("openai", text, usage)
+        else:
+            self._send_json(_openai_body(text, usage))
+
+    def _prompt_usage(self, provider: str, request: dict):
+        """(prompt tokens, cached tokens, cache write tokens) at 4 characters per token."""
+        prompt_tokens = len(json.dumps(request.get("system", "")) + json.dumps(request.get("messages") or request.get("contents") or [])) // 4
+        if provider == "anthropic":
+            system = request.get("system")
+            blocks = system if isinstance(system, list) else []
+            prefix = "".join(block["text"] for block in blocks if block.get("cache_control"))
+        else:
+            messages = request.get("messages") or request.get("contents") or [{}]
+            first = messages[0]
+            prefix = first.get("content") or "".join(part.get("text", "") for part in first.get("parts", []))
+        prefix_tokens = len(prefix) // 4
+        if prefix_tokens < self.server.cache_min_tokens:
+            return prompt_tokens, 0, 0
+        with self.server._lock:
+            seen = (provider, prefix) in self.server._cached_prefixes
+            self.server._cached_prefixes.add((provider, prefix))
+        return prompt_tokens, prefix_tokens if seen else 0, 0 if seen else prefix_tokens
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int):
+        body = json.dumps({"error": {"message": "injected failure"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, provider: str, text: str, usage: tuple):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in _stream_events(provider, text, usage):
+            if self.server.chars_per_sec and _event_text(provider, event):
+                time.sleep(len(_event_text(provider, event)) / self.server.chars_per_sec)
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        if provider == "openai":
+            self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+def _fused_task_ids(request: dict):
+    messages = request.get("messages") or [{"content": part.get("text", "")} for content in request.get("contents", [])
+                                           for part in content.get("parts", [])]
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str) and FUSED_MARKER in content:
+            return list(json.loads(content.split("\n", 1)[1]))
+    return []
+
+
+def _openai_usage(text: str, usage: tuple):
+    prompt_tokens, cached_tokens, _ = usage
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+
+def _anthropic_input_usage(usage: tuple):
+    # Anthropic reports cache reads and writes separately from the uncached input tokens.
+    prompt_tokens, cached_tokens, written_tokens = usage
+    return {"input_tokens": prompt_tokens - cached_tokens - written_tokens, "cache_read_input_tokens": cached_tokens,
+            "cache_creation_input_tokens": written_tokens}
+
+
+def _google_usage(text: str, usage: tuple):
+    prompt_tokens, cached_tokens, _ = usage
+    return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4,
+            "cachedContentTokenCount": cached_tokens}
+
+
+def _openai_body(text: str, usage: tuple):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": _openai_usage(text, usage)}
+
+
+def _anthropic_body(text: str, usage: tuple):
+    return {"content": [{"type": "text", "text": text}],
+            "usage": {**_anthropic_input_usage(usage), "output_tokens": len(text) // 4}}
+
+
+def _google_body(text: str, usage: tuple):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+            "usageMetadata": _google_usage(text, usage)}
+
+
+def _event_text(provider: str, event: dict):
+    if provider == "openai":
+        return "".join(choice["delta"].get("content", "") for choice in event.get("choices", []))
+    if provider == "anthropic":
+        return event.get("delta", {}).get("text", "")
+    return "".join(part.get("text", "") for candidate in event.get("candidates", [])
+                   for part in candidate["content"]["parts"])
+
+
+def _stream_events(provider: str, text: str, usage: tuple):
+    chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+    if provider == "openai":
+        for chunk in chunks:
+            yield {"choices": [{"delta": {"content": chunk}}]}
+        yield {"choices": [], "usage": _openai_usage(text, usage)}
+    elif provider == "anthropic":
+        yield {"type": "message_start", "message": {"usage": _anthropic_input_usage(usage)}}
+        for chunk in chunks:
+            yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}
+        yield {"type": "message_delta", "usage": {"output_tokens": len(text) // 4}}
+        yield {"type": "message_stop"}
+    else:
+        for chunk in chunks:
+            yield {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}],
+                   "usageMetadata": _google_usage(text, usage)}
@@ -20,4 +20,51 @@ DEFAULT_TEMPERATURE = _cfg.get("DEFAULT_TEMPERATURE", 0.0)
 MAX_RETRIES = int(_cfg.get("MAX_RETRIES", 3))
 RETRY_BACKOFF_SEC = float(_cfg.get("RETRY_BACKOFF_SEC", 1.5))
 DB_PATH = _cfg.get("DB_PATH", "memory.db")
-MAX_HISTORY_WINDOW = int(_cfg.get("MAX_HISTORY_WINDOW", 4))
\ No newline at end of file
+MAX_HISTORY_WINDOW = int(_cfg.get("MAX_HISTORY_WINDOW", 4))
+MAX_PARALLEL_STEPS = int(_cfg.get("MAX_PARALLEL_STEPS", 4))
+HTTP_TIMEOUT_SEC = float(_cfg.get("HTTP_TIMEOUT_SEC", 60))
+HTTP_POOL_MAX_IDLE = int(_cfg.get("HTTP_POOL_MAX_IDLE", 4))
+HTTP_POOL_IDLE_TIMEOUT_SEC = float(_cfg.get("HTTP_POOL_IDLE_TIMEOUT_SEC", 30))
+STREAM_RESPONSES = bool(_cfg.get("STREAM_RESPONSES", True))
+LLM_CACHE_ENABLED = bool(_cfg.get("LLM_CACHE_ENABLED", True))
+LLM_CACHE_DB = _cfg.get("LLM_CACHE_DB", "data/llm_cache.db")
+LLM_CACHE_MEMORY_ITEMS = int(_cfg.get("LLM_CACHE_MEMORY_ITEMS", 256))
+LLM_CACHE_TTL_SEC = float(_cfg.get("LLM_CACHE_TTL_SEC", 86400))
+LLM_CACHE_MAX_ROWS = int(_cfg.get("LLM_CACHE_MAX_ROWS", 10000))
+RECALL_TOP_K = int(_cfg.get("RECALL_TOP_K", 5))
+RECALL_SNIPPET_CHARS = int(_cfg.get("RECALL_SNIPPET_CHARS", 500))
+PLANNER_CONTEXT_TOKEN_BUDGET = int(_cfg.get("PLANNER_CONTEXT_TOKEN_BUDGET", 3000))
+CONTEXT_ITEM_MAX_TOKENS = int(_cfg.get("CONTEXT_ITEM_MAX_TOKENS", 500))
+PROMPT_RESULT_MAX_CHARS = int(_cfg.get("PROMPT_RESULT_MAX_CHARS", 20000))
+REGISTRY_CHECK_INTERVAL_SEC = float(_cfg.get("REGISTRY_CHECK_INTERVAL_SEC", 1.0))
+TOOL_MANIFEST_PATH = _cfg.get("TOOL_MANIFEST_PATH", "data/tool_manifest.json")
+TOOL_EXECUTION_MODE = _cfg.get("TOOL_EXECUTION_MODE", "process")
+TOOL_WORKERS = int(_cfg.get("TOOL_WORKERS", 4))
+TOOL_TIMEOUT_SEC = float(_cfg.get("TOOL_TIMEOUT_SEC", 30))
+TOOL_CACHE_MAX_ITEMS = int(_cfg.get("TOOL_CACHE_MAX_ITEMS", 1024))
+LLM_MAX_INFLIGHT_CALLS = int(_cfg.get("LLM_MAX_INFLIGHT_CALLS", 16))
+SERVER_HOST = _cfg.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(_cfg.get("SERVER_PORT", 8080))
+SERVER_WORKERS = int(_cfg.get("SERVER_WORKERS", 32))
+SESSION_IDLE_TIMEOUT_SEC = float(_cfg.get("SESSION_IDLE_TIMEOUT_SEC", 1800))
+TRACING_ENABLED = bool(_cfg.get("TRACING_ENABLED", True))
+PIPELINED_PLANNING = bool(_cfg.get("PIPELINED_PLANNING", False))
+PLANNER_JSON_MODE = bool(_cfg.get("PLANNER_JSON_MODE", True))
+LLM_MAX_ATTEMPTS = int(_cfg.get("LLM_MAX_ATTEMPTS", 3))
+LLM_RETRY_MAX_DELAY_SEC = float(_cfg.get("LLM_RETRY_MAX_DELAY_SEC", 8))
+LLM_BREAKER_FAILURES = int(_cfg.get("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN_SEC = float(_cfg.get("LLM_BREAKER_COOLDOWN_SEC", 30))
+FAILOVER_MODELS = dict(_cfg.get("FAILOVER_MODELS", {}))
+LLM_HEDGE_PERCENTILE = float(_cfg.get("LLM_HEDGE_PERCENTILE", 0))
+LLM_HEDGE_MIN_SAMPLES = int(_cfg.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_RATE_LIMITS = dict(_cfg.get("LLM_RATE_LIMITS", {}))
+LLM_SCHEDULER_STATS_INTERVAL_SEC = float(_cfg.get("LLM_SCHEDULER_STATS_INTERVAL_SEC", 60))
+PROMPT_CACHING = bool(_cfg.get("PROMPT_CACHING", True))
+ROUTER_ENABLED = bool(_cfg.get("ROUTER_ENABLED", True))
+ROUTER_CONFIDENCE = float(_cfg.get("ROUTER_CONFIDENCE", 0.95))
+ROUTER_MIN_SAMPLES = int(_cfg.get("ROUTER_MIN_SAMPLES", 50))
+ROUTER_TEMPLATE_MIN_COUNT = int(_cfg.get("ROUTER_TEMPLATE_MIN_COUNT", 3))
+ROUTER_TRAINING_EVENTS = int(_cfg.get("ROUTER_TRAINING_EVENTS", 5000))
+ROUTER_SHADOW_RATE = float(_cfg.get("ROUTER_SHADOW_RATE", 0))
+PLAN_OPTIMIZER_ENABLED = bool(_cfg.get("PLAN_OPTIMIZER_ENABLED", True))
+PLAN_FUSE_MAX_STEPS = int(_cfg.get("PLAN_FUSE_MAX_STEPS", 4))
@@ -1,15 +1,41 @@
 from llm_client import chat_completion
+from scheduler import PRIORITY_BACKGROUND
 from memory import save_message, save_tool_output
-import importlib
+from logger import log_event
+from tool_cache import tool_cache, freshness_ttl, NEVER
+from loader import default_registry
+from tool_pool import get_tool_pool
+from config import MAX_PARALLEL_STEPS, TOOL_EXECUTION_MODE, TOOL_WORKERS, TOOL_TIMEOUT_SEC
+from step_params import compile_params, params_to_prompt
+import tracing
+import contextlib
+import contextvars
 import json
-import re
-import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from graphlib import TopologicalSorter, CycleError
 
-AGENTS_DIR = "Agents"
+# Output tokens a fused call may use per task: what each task's own call gets by default.
+FUSED_MAX_TOKENS_PER_TASK = 800
+FUSED_TASKS_HEADER = ("Execute each of the following tasks independently. Reply with a JSON object that maps every "
+                      "task id to the complete answer for that task, as a string.")
 
-def execute_plan(plan: dict, agents_dir=AGENTS_DIR, user_input=""):
+@contextlib.contextmanager
+def _cancel_on_exit(cancel_event):
+    """Sets `cancel_event` if the block is left by an exception (e.g. Ctrl+C), so isolated tools still running are
+    killed instead of being waited for when the step pool shuts down."""
+    try:
+        yield
+    except BaseException:
+        cancel_event.set()
+        raise
+
+def execute_plan(plan: dict, user_input="", max_workers=MAX_PARALLEL_STEPS, registry=None,
+                 cancel_event=None):
     
+    registry = registry or default_registry()
     steps = plan.get("steps", [])
     if not steps:
         return {"error": "No steps in the plan to execute."}
@@ -27,71 +53,301 @@ def execute_plan(plan: dict, agents_dir=AGENTS_DIR, user_input=""):
         return {"error": f"Cycle detected: {e}"}
 
     execution_results = {"initial_request": user_input}
+    compiled = {step_id: compile_params(step.get("params", {})) for step_id, step in steps_by_id.items()}
+    handles = {}
+    plan_order = list(steps_by_id)
+    persisted = 0
 
-    while ts.is_active():
-        ready_steps_group = ts.get_ready()
+    # Each step is marked done as soon as it finishes so its dependents can start
+    # without waiting for the rest of its batch.
+    cancel_event = cancel_event or threading.Event()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool, _cancel_on_exit(cancel_event):
+        running = {}
+        while ts.is_active():
+            for step_id in ts.get_ready():
+                step = steps_by_id[step_id]
+                params = _step_params(step, compiled[step_id], execution_results, handles)
+                # Run in a copy of this context so step spans nest under the current span.
+                future = pool.submit(contextvars.copy_context().run, _run_step, step, params, registry, cancel_event,
+                                     time.perf_counter())
+                running[future] = step_id
 
-        for step_id in ready_steps_group:
-            step = steps_by_id[step_id]
-            step_type = step.get("type")
-            step_name = step.get("name", "")
-            raw_params = step.get("params", {})
-            params = substitute_params(raw_params, execution_results)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id = running.pop(future)
+                _store_result(steps_by_id[step_id], future.result(), execution_results)
+                ts.done(step_id)
 
-            result = None
-            if step_type == "agent":
-                result = run_agent(step_name, params=params)
-                save_message(role="assistant", content=result, meta={"agent": step_name, "step_id": step_id})
+            # Persist in plan order regardless of completion order.
+            while persisted < len(plan_order) and plan_order[persisted] in execution_results:
+                step_id = plan_order[persisted]
+                _persist_step(steps_by_id[step_id], execution_results)
+                persisted += 1
 
-            elif step_type == "tool":
-                result = run_tool(step_name, params)
-                save_tool_output(tool_name=step_name, output=result, meta={"step_id": step_id})
-            
-            execution_results[step_id] = result
-            
-            ts.done(step_id)
+    ordered_results = {"initial_request": user_input}
+    for step_id in plan_order:
+        for result_id in steps_by_id[step_id].get("fused") or [step_id]:
+            ordered_results[result_id] = execution_results.get(result_id)
+    return ordered_results
 
-    return execution_results
+def execute_streamed_plan(produce_plan, user_input="", max_workers=MAX_PARALLEL_STEPS,
+                          registry=None, cancel_event=None):
+    """Runs steps while the plan is still being produced, returning (plan, results).
 
-def substitute_params(params, results: dict):
+    `produce_plan(on_step)` is called on its own thread; it must call `on_step(step)` for each complete step and
+    return the full plan. A step is dispatched once it has arrived and all of its `depends_on` steps are done.
+    The full plan is validated as a DAG when it arrives, and an invalid plan yields the same error results as
+    execute_plan. If `produce_plan` raises before any step was dispatched, the exception is re-raised so the
+    caller can plan again. If steps were already dispatched, nothing is run twice: running steps are drained
+    and the plan of the steps that ran is returned with their results and an "error" entry.
+
+    `on_step` raises once `cancel_event` is set, which is also done when this function exits on an exception,
+    so the producer stops streaming.
+    """
+    registry = registry or default_registry()
+    cancel_event = cancel_event or threading.Event()
+    events = queue.Queue()
+
+    def on_step(step):
+        if cancel_event.is_set():
+            raise RuntimeError("Plan stream cancelled.")
+        events.put(("step", step))
+
+    def produce():
+        try:
+            events.put(("plan", produce_plan(on_step)))
+        except Exception as e:
+            events.put(("plan_error", e))
+
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), name="plan-stream", daemon=True).start()
+
+    execution_results = {"initial_request": user_input}
+    steps_by_id = {}
+    waiting = {}
+    plan = None
+    plan_error = None
+    running = 0
+    dispatched = 0
+    persisted = 0
+    handles = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool, _cancel_on_exit(cancel_event):
+        while (plan is None and plan_error is None) or running:
+            event = events.get()
+            if event[0] == "step":
+                step = event[1]
+                if "id" in step and step["id"] not in steps_by_id:
+                    steps_by_id[step["id"]] = waiting[step["id"]] = step
+            elif event[0] == "done":
+                _, step_id, future = event
+                _store_result(steps_by_id[step_id], future.result(), execution_results)
+                running -= 1
+            elif event[0] == "plan":
+                plan = event[1]
+                # Normally every step was already streamed; pick up any the incremental parser missed.
+                for step in plan.get("steps", []):
+                    if isinstance(step, dict) and "id" in step and step["id"] not in steps_by_id:
+                        steps_by_id[step["id"]] = waiting[step["id"]] = step
+            else:
+                plan_error = event[1]
 
-    if isinstance(params, dict):
-        return {k: substitute_params(v, results) for k, v in params.items()}
-    elif isinstance(params, list):
-        return [substitute_params(item, results) for item in params]
-    elif isinstance(params, str):
-        match = re.fullmatch(r"\{([a-zA-Z0-9_]+)\}", params)
-        if match:
-            step_id = match.group(1)
-            return results.get(step_id, params)
-
-        def repl(m):
-            step_id = m.group(1)
-            return str(results.get(step_id, m.group(0)))
-
-        return re.sub(r"\{([a-zA-Z0-9_]+)\}", repl, params)
+            if plan_error is None:
+                for step_id, step in list(waiting.items()):
+                    if all(dep in execution_results and dep in steps_by_id for dep in step.get("depends_on", [])):
+                        del waiting[step_id]
+                        params = _step_params(step, compile_params(step.get("params", {})), execution_results,
+                                              handles)
+                        future = pool.submit(contextvars.copy_context().run, _run_step, step, params, registry,
+                                             cancel_event, time.perf_counter())
+                        future.add_done_callback(lambda f, step_id=step_id: events.put(("done", step_id, f)))
+                        running += 1
+                        dispatched += 1
+
+            plan_order = list(steps_by_id)
+            while persisted < len(plan_order) and plan_order[persisted] in execution_results:
+                step_id = plan_order[persisted]
+                _persist_step(steps_by_id[step_id], execution_results)
+                persisted += 1
+
+    if plan_error is not None:
+        if not dispatched:
+            raise plan_error
+        ran = [step for step_id, step in steps_by_id.items() if step_id in execution_results]
+        log_event("streamed_plan_failed", {"error": str(plan_error), "steps_run": len(ran)})
+        partial_results = {"initial_request": user_input}
+        for step in ran:
+            for result_id in step.get("fused") or [step["id"]]:
+                partial_results[result_id] = execution_results.get(result_id)
+        partial_results["error"] = f"Planning failed after {len(ran)} step(s) had run: {plan_error}"
+        return {"steps": ran}, partial_results
+
+    steps = plan.get("steps", [])
+    if not steps:
+        return plan, {"error": "No steps in the plan to execute."}
+    error = validate_plan_graph(steps)
+    if error:
+        return plan, error
+
+    ordered_results = {"initial_request": user_input}
+    for step in steps:
+        for result_id in step.get("fused") or [step["id"]]:
+            ordered_results[result_id] = execution_results.get(result_id)
+    return plan, ordered_results
+
+def validate_plan_graph(steps: list):
+    """Returns an {"error": ...} dict if the steps do not form a valid DAG, otherwise None."""
+    try:
+        step_ids = {step['id'] for step in steps}
+        dependency_graph = {step['id']: set(step.get('depends_on', [])) for step in steps}
+    except (KeyError, TypeError) as e:
+        return {"error": f"Invalid plan format: {e}"}
+    unknown = sorted({dep for deps in dependency_graph.values() for dep in deps} - step_ids)
+    if unknown:
+        return {"error": f"Invalid plan format: unknown dependencies {unknown}"}
+    try:
+        TopologicalSorter(dependency_graph).prepare()
+    except CycleError as e:
+        return {"error": f"Cycle detected: {e}"}
+    return None
+
+def _run_step(step: dict, params: dict, registry, cancel_event=None, submitted=None):
+    step_type = step.get("type")
+    step_name = step.get("name", "")
+    with tracing.span(f"step:{step['id']}") as trace_span:
+        if submitted is not None:
+            trace_span.add_queue_time(time.perf_counter() - submitted)
+        if step_type == "agent" and step.get("fused"):
+            return run_fused_agent(step_name, params, registry=registry)
+        if step_type == "agent":
+            return run_agent(step_name, params=params, registry=registry)
+        if step_type == "tool":
+            return run_tool(step_name, params, registry=registry, cancel_event=cancel_event)
+        return None
+
+def _store_result(step: dict, result, execution_results: dict):
+    """Records a step's result; a fused agent step (see plan_optimizer) returns one result per original step."""
+    if step.get("fused"):
+        execution_results.update(result)
     else:
-        return params
+        execution_results[step["id"]] = result
 
-def load_agent_meta(agent_name, agents_dir=AGENTS_DIR):
-    
-    path = os.path.join(agents_dir, f"{agent_name}.json")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _persist_step(step: dict, execution_results: dict):
+    step_type = step.get("type")
+    step_name = step.get("name", "")
+    for result_id in step.get("fused") or [step["id"]]:
+        result = execution_results.get(result_id)
+        if step_type == "agent":
+            save_message(role="assistant", content=result, meta={"agent": step_name, "step_id": result_id})
+        elif step_type == "tool":
+            save_tool_output(tool_name=step_name, output=result, meta={"step_id": result_id})
 
-def run_agent(agent_name: str, params: dict):
-    
-    agent_meta = load_agent_meta(agent_name)
-    user_content = f"Execute the task with the following parameters:\n{json.dumps(params, indent=2)}"
-    messages = [{"role": "user", "content": user_content}, {"role": "system", "content": agent_meta["system_prompt"]}]
-    response = chat_completion(model=agent_meta["model"], messages=messages, temperature=agent_meta["temperature"])
-    return response
+def _step_params(step: dict, compiled, results: dict, handles: dict):
+    """Tools get result values; agents get result handles shared across the run (see step_params)."""
+    return compiled.render(results, handles if step.get("type") == "agent" else None)
 
-def run_tool(tool_name, params):
+def substitute_params(params, results: dict):
+    return compile_params(params).render(results)
+
+def run_agent(agent_name: str, params: dict, registry=None):
     
-    try:
-        module = importlib.import_module(f"Tools.{tool_name}")
-        func = getattr(module, tool_name)
-        return func(**params)
-    except Exception as e:
-        return f"Tool {tool_name} error: {e}"
\ No newline at end of file
+    with tracing.span(f"agent:{agent_name}"):
+        agent_meta = (registry or default_registry()).get_agent(agent_name)
+        user_content = f"Execute the task with the following parameters:\n{params_to_prompt(params)}"
+        messages = [{"role": "user", "content": user_content}, {"role": "system", "content": agent_meta["system_prompt"]}]
+        response = chat_completion(model=agent_meta["model"], messages=messages, temperature=agent_meta["temperature"],
+                                   cache=agent_meta.get("cache"), priority=PRIORITY_BACKGROUND)
+        return response
+
+def run_fused_agent(agent_name: str, params_by_step: dict, registry=None):
+    """Runs several independent tasks for one agent in a single call; returns {step_id: result}.
+
+    Falls back to one concurrent call per task if the answer cannot be split by step id.
+    """
+    with tracing.span(f"agent:{agent_name}", fused=len(params_by_step)) as trace_span:
+        agent_meta = (registry or default_registry()).get_agent(agent_name)
+        user_content = f"{FUSED_TASKS_HEADER}\n{params_to_prompt(params_by_step)}"
+        messages = [{"role": "user", "content": user_content}, {"role": "system", "content": agent_meta["system_prompt"]}]
+        response = chat_completion(model=agent_meta["model"], messages=messages, temperature=agent_meta["temperature"],
+                                   max_tokens=FUSED_MAX_TOKENS_PER_TASK * len(params_by_step),
+                                   cache=agent_meta.get("cache"), priority=PRIORITY_BACKGROUND, json_mode=True)
+        if isinstance(response, dict):
+            return {step_id: response for step_id in params_by_step}
+        try:
+            answers = json.loads(response)
+            if isinstance(answers, dict) and all(step_id in answers for step_id in params_by_step):
+                return {step_id: answers[step_id] if isinstance(answers[step_id], str) else json.dumps(answers[step_id])
+                        for step_id in params_by_step}
+        except ValueError:
+            pass
+        log_event("fused_agent_unsplit", {"agent": agent_name, "steps": list(params_by_step)})
+        trace_span.set(unsplit=True)
+    with ThreadPoolExecutor(max_workers=len(params_by_step)) as pool:
+        futures = {step_id: pool.submit(contextvars.copy_context().run, run_agent, agent_name, params, registry)
+                   for step_id, params in params_by_step.items()}
+    return {step_id: future.result() for step_id, future in futures.items()}
+
+def _tool_error(tool_name: str, status: str, message: str):
+    log_event("tool_failed", {"tool": tool_name, "status": status, "error": message})
+    return {"error": f"Tool {tool_name} {status}: {message}", "tool": tool_name, "status": status}
+
+_isolated_info = {}
+
+def _isolated_tool_info(module_path: str, mtime, cancel_event=None):
+    """A tool's metadata for process mode, read in a worker and cached per file version."""
+    key = (module_path, mtime)
+    if key not in _isolated_info:
+        status, info = get_tool_pool(TOOL_WORKERS).info(module_path, mtime, timeout=TOOL_TIMEOUT_SEC,
+                                                        cancel_event=cancel_event)
+        if status != "ok":
+            return status, info
+        _isolated_info[key] = info
+    return "ok", _isolated_info[key]
+
+def run_tool(tool_name, params, registry=None, cancel_event=None):
+    """Runs a tool through the result cache. Failures return {"error", "tool", "status"} in both execution modes.
+
+    Setting `cancel_event` kills an isolated tool that is still running; an inline one runs to completion.
+    """
+    with tracing.span(f"tool:{tool_name}") as trace_span:
+        try:
+            registry = registry or default_registry()
+            if cancel_event is not None and cancel_event.is_set():
+                return _tool_error(tool_name, "cancelled", "cancelled before it started")
+            if TOOL_EXECUTION_MODE == "process":
+                module_path, mtime = registry.tool_source(tool_name)
+                status, info = _isolated_tool_info(module_path, mtime, cancel_event)
+                if status != "ok":
+                    result = _tool_error(tool_name, status, info)
+                    trace_span.fail(result["error"])
+                    return result
+                version = (module_path, mtime)
+            else:
+                func, info = registry.get_tool(tool_name)
+                version = func
+            freshness = info.get("freshness", NEVER)
+
+            hit, result, saved_sec = tool_cache.get(tool_name, params, freshness, version=version)
+            if hit:
+                log_event("tool_cache_hit", {"tool": tool_name, "saved_sec": saved_sec, **tool_cache.stats()})
+                trace_span.set(cache="hit")
+                return result
+
+            start = time.perf_counter()
+            if TOOL_EXECUTION_MODE == "process":
+                status, result = get_tool_pool(TOOL_WORKERS).run(
+                    module_path, tool_name, mtime, params,
+                    timeout=info.get("timeout", TOOL_TIMEOUT_SEC), cancel_event=cancel_event
+                )
+                if status != "ok":
+                    result = _tool_error(tool_name, status, result)
+                    trace_span.fail(result["error"])
+                    return result
+            else:
+                result = func(**params)
+            tool_cache.put(tool_name, params, freshness, result, time.perf_counter() - start, version=version)
+            if freshness_ttl(freshness) != 0:
+                log_event("tool_cache_miss", {"tool": tool_name, **tool_cache.stats()})
+            return result
+        except Exception as e:
+            trace_span.fail(e)
+            return _tool_error(tool_name, "error", f"{type(e).__name__}: {e}")
\ No newline at end of file
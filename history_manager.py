@@ -1,63 +1,271 @@
-from config import MAX_HISTORY_WINDOW
+from config import MAX_HISTORY_WINDOW, RECALL_TOP_K, RECALL_SNIPPET_CHARS, PLANNER_MODEL
+from config import PLANNER_CONTEXT_TOKEN_BUDGET, CONTEXT_ITEM_MAX_TOKENS
 import json
+import time
+import uuid
+from collections import deque
 from logger import log_event
+from memory import memory_store
+from llm_client import _get_provider
 
-def summarize_conversation_history(history_turns: list):
-    if not history_turns:
+# Average characters per token for each provider's tokenizer on English text and JSON.
+_CHARS_PER_TOKEN = {"openai": 4.0, "anthropic": 3.5, "google": 4.0}
+
+def estimate_tokens(text: str, provider: str = "openai"):
+    """Cheap local token estimate; no tokenizer is loaded."""
+    if not text:
+        return 0
+    return int(len(text) / _CHARS_PER_TOKEN.get(provider, 4.0)) + 1
+
+def truncate_to_tokens(text: str, max_tokens: int, provider: str = "openai"):
+    if estimate_tokens(text, provider) <= max_tokens:
+        return text
+    keep = int(max_tokens * _CHARS_PER_TOKEN.get(provider, 4.0))
+    return f"{text[:keep]}... [truncated, {len(text) - keep} more characters]"
+
+
+class Turn:
+    __slots__ = ("user_input", "plan", "response", "results")
+
+    def __init__(self, user_input: str, plan: dict, response: str, results: dict):
+        self.user_input = user_input
+        self.plan = plan
+        self.response = response
+        self.results = results
+
+
+class ConversationHistory:
+    """A session's turns. The last `window` stay in memory; every turn is written to the memory database.
+
+    Older turns are read back only when indexed, so a long session holds a fixed number of turns. Creating
+    a history with an existing `session_id` resumes that conversation.
+    """
+
+    def __init__(self, session_id: str = None, window: int = MAX_HISTORY_WINDOW, store=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.window = max(1, window)
+        self._store = store or memory_store
+        self._recent = deque(maxlen=self.window)
+        self._first = None
+        self._count = None
+
+    def _load(self):
+        """Reads the turn count and the newest window of a resumed session on first use."""
+        if self._count is not None:
+            return
+        self._count = self._store.count_turns(self.session_id)
+        self._recent.extend(self._load_range(max(0, self._count - self.window), self._count))
+        if self._count:
+            log_event("history_resumed", {"session_id": self.session_id, "turns": self._count})
+
+    def _load_range(self, start: int, stop: int):
+        return [Turn(*row) for row in self._store.load_turns(self.session_id, start, stop)]
+
+    def __len__(self):
+        self._load()
+        return self._count
+
+    def __getitem__(self, index):
+        self._load()
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if start >= stop:
+                return []
+            offset = self._count - len(self._recent)
+            if start == 0 and stop == 1 and self._first is not None:
+                turns = [self._first]
+            elif start >= offset:
+                turns = list(self._recent)[start - offset:stop - offset]
+            else:
+                turns = self._load_range(start, stop)
+            return turns[::step]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("conversation history index out of range")
+        turns = self[index:index + 1]
+        if not turns:
+            raise IndexError(f"turn {index} of session {self.session_id} is missing from the memory database")
+        if index == 0:
+            self._first = turns[0]
+        return turns[0]
+
+    def append(self, turn: Turn):
+        self._load()
+        self._store.save_turn(self.session_id, self._count, turn.user_input, turn.response, turn.plan, turn.results)
+        self._recent.append(turn)
+        self._count += 1
+
+
+def summarize_conversation_history(first_turn: Turn, turns_summarized: int):
+    if not turns_summarized:
         return ""
 
-    first_turn = history_turns[0]
     summary = (
-        f"Conversation started with user asking: '{first_turn['user_input']}'. "
-        f"Assistant's initial response was: '{first_turn['response']}'."
+        f"Conversation started with user asking: '{first_turn.user_input}'. "
+        f"Assistant's initial response was: '{first_turn.response}'."
     )
     
-    if len(history_turns) > 1:
-        omitted_count = len(history_turns) - 1
+    if turns_summarized > 1:
+        omitted_count = turns_summarized - 1
         summary += f"\n... ({omitted_count} older turn(s) omitted for brevity) ..."
 
     log_event(
         "history_summarized", 
-        {"summary": summary, "turns_summarized": len(history_turns), "method": "truncation"}
+        {"summary": summary, "turns_summarized": turns_summarized, "method": "truncation"}
     )
     return summary
 
-def build_context_for_planner(conversation_history: list, current_user_input: str):
-    context_summary = ""
-    if len(conversation_history) > MAX_HISTORY_WINDOW:
-        turns_to_summarize = conversation_history[:-MAX_HISTORY_WINDOW]
-        context_summary = summarize_conversation_history(turns_to_summarize)
+def recall_relevant_context(current_user_input: str, recent_turns: list, session_id: str = None):
+    """Formats the stored messages and tool outputs of `session_id` most relevant to the request, skipping the
+    recent window."""
+    start = time.perf_counter()
+    seen = {current_user_input}
+    for turn in recent_turns:
+        seen.add(turn.user_input)
+        seen.add(turn.response)
 
-    recent_turns = conversation_history[-MAX_HISTORY_WINDOW:]
+    hits = memory_store.recall(current_user_input, limit=RECALL_TOP_K + len(seen), session_id=session_id)
+    lines = []
+    for hit in hits:
+        if hit["content"] in seen:
+            continue
+        seen.add(hit["content"])
+        snippet = hit["content"][:RECALL_SNIPPET_CHARS]
+        if hit["source"] == "tool":
+            lines.append(f"- [{hit['ts']}] Tool {hit['tool_name']} returned: {snippet}")
+        else:
+            lines.append(f"- [{hit['ts']}] {hit['role']}: {snippet}")
+        if len(lines) >= RECALL_TOP_K:
+            break
 
-    previously_gathered_info = {}
-    for turn in recent_turns:
-        plan = turn.get("plan", {})
-        results = turn.get("results", {})
-        if plan and results:
-            tool_steps = {step["name"] for step in plan.get("steps", []) if step.get("type") == "tool"}
-            for tool_name in tool_steps:
-                if tool_name in results:
-                    previously_gathered_info[tool_name] = results[tool_name]
-
-    info_text = "No information has been gathered yet."
-    if previously_gathered_info:
-        info_text = json.dumps(previously_gathered_info, indent=2)
-
-    recent_history_text = "\n".join(
-        f"User's previous message was: '{turn['user_input']}'. Final response was: '{turn['response']}'."
-        for turn in recent_turns
-    )
+    log_event("history_recalled", {"hits": len(lines), "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)})
+    return lines
+
+
+class PlannerContextBuilder:
+    """Packs the planner context into a token budget by section priority.
 
-    return f"""CONVERSATION SUMMARY:
+    Rendered turn lines and tool outputs are cached per turn, so a new turn only renders itself.
+    """
+
+    def __init__(self, token_budget: int = PLANNER_CONTEXT_TOKEN_BUDGET, item_max_tokens: int = CONTEXT_ITEM_MAX_TOKENS,
+                 provider: str = None):
+        self.token_budget = token_budget
+        self.item_max_tokens = item_max_tokens
+        self.provider = provider or _get_provider(PLANNER_MODEL or "")
+        self._segments = {}
+
+    def _render_turn(self, turn: Turn):
+        """Returns (turn_line, [(tool_name, tool_text), ...]) for a turn, rendering it at most once."""
+        cached = self._segments.get(id(turn))
+        if cached is not None and cached[0] is turn:
+            return cached[1], cached[2]
+
+        turn_line = truncate_to_tokens(
+            f"User's previous message was: '{turn.user_input}'. Final response was: '{turn.response}'.",
+            self.item_max_tokens, self.provider
+        )
+        tool_texts = []
+        plan = turn.plan or {}
+        results = turn.results or {}
+        for step in plan.get("steps", []):
+            if step.get("type") == "tool" and step.get("id") in results:
+                text = json.dumps(results[step["id"]], indent=2, default=str)
+                tool_texts.append((step.get("name", ""), truncate_to_tokens(text, self.item_max_tokens, self.provider)))
+
+        self._segments[id(turn)] = (turn, turn_line, tool_texts)
+        return turn_line, tool_texts
+
+    def build(self, conversation_history, current_user_input: str, session_id: str = None):
+        recent_turns = conversation_history[-MAX_HISTORY_WINDOW:]
+        rendered = [self._render_turn(turn) for turn in recent_turns]
+        live = {id(turn) for turn in recent_turns}
+        for key in [key for key in self._segments if key not in live]:
+            del self._segments[key]
+
+        remaining = self.token_budget - estimate_tokens(current_user_input, self.provider)
+
+        def fits(text):
+            nonlocal remaining
+            cost = estimate_tokens(text, self.provider) + 1
+            if cost > remaining:
+                return False
+            remaining -= cost
+            return True
+
+        # Priority: recent turns (newest first), then gathered tool outputs, recalled context, and the summary.
+        turn_lines = []
+        for turn_line, _ in reversed(rendered):
+            if not fits(turn_line):
+                break
+            turn_lines.insert(0, turn_line)
+
+        gathered = {}
+        for _, tool_texts in reversed(rendered):
+            for tool_name, text in tool_texts:
+                if tool_name not in gathered and fits(text):
+                    gathered[tool_name] = text
+
+        recalled = [line for line in recall_relevant_context(current_user_input, recent_turns, session_id)
+                    if fits(line)]
+
+        context_summary = ""
+        if len(conversation_history) > MAX_HISTORY_WINDOW:
+            summary = summarize_conversation_history(conversation_history[0],
+                                                     len(conversation_history) - MAX_HISTORY_WINDOW)
+            if fits(summary):
+                context_summary = summary
+
+        omitted_turns = len(recent_turns) - len(turn_lines)
+        if omitted_turns:
+            turn_lines.insert(0, f"({omitted_turns} earlier recent turn(s) omitted to fit the context budget)")
+
+        recalled_text = "\n".join(recalled) or "Nothing relevant found."
+        recent_history_text = "\n".join(turn_lines)
+        info_text = "No information has been gathered yet."
+        if gathered:
+            info_text = "\n".join(f"{tool_name}:\n{text}" for tool_name, text in gathered.items())
+
+        log_event("planner_context_built", {
+            "token_budget": self.token_budget,
+            "estimated_tokens": self.token_budget - remaining,
+            "turns_included": len(turn_lines) - (1 if omitted_turns else 0),
+            "turns_omitted": omitted_turns,
+            "tool_outputs_included": len(gathered),
+            "recalled_included": len(recalled),
+        })
+
+        return f"""CONVERSATION SUMMARY:
 {context_summary}
 
+RELEVANT EARLIER CONTEXT:
+These are older messages and tool outputs retrieved because they may be relevant to the current request.
+{recalled_text}
+
 RECENT TURNS:
 {recent_history_text}
 
 PREVIOUSLY GATHERED INFORMATION:
-This is a JSON object of tool names and their outputs from recent turns. If the user's current request can be answered using this information, you don't need to call the same tool again for information that is static (e.g., OS version).
+These are tool names and their outputs from recent turns (large outputs are truncated). If the user's current request can be answered using this information, you don't need to call the same tool again for information that is static (e.g., OS version).
 {info_text}
 
 CURRENT USER REQUEST:
 {current_user_input}"""
+
+
+_context_builder = None
+
+def build_context_for_planner(conversation_history, current_user_input: str, context_builder=None,
+                              session_id: str = None):
+    """Builds the planner context; pass a per-session `context_builder` when serving several conversations.
+
+    Recall searches only `session_id`'s messages and tool outputs (default: the history's session id).
+    """
+    session_id = session_id or getattr(conversation_history, "session_id", None)
+    global _context_builder
+    if context_builder is None:
+        if _context_builder is None:
+            _context_builder = PlannerContextBuilder()
+        context_builder = _context_builder
+    return context_builder.build(conversation_history, current_user_input, session_id)
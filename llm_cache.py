@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import LLM_CACHE_DB, LLM_CACHE_MEMORY_ITEMS, LLM_CACHE_TTL_SEC, LLM_CACHE_MAX_ROWS
+
+CACHE_TABLE_NAME = "llm_cache"
+EVICT_EVERY_N_PUTS = 50
+
+
+def make_cache_key(provider: str, model: str, messages: list, temperature: float, max_tokens: int,
+                   json_mode: bool):
+    raw = json.dumps([provider, model, messages, temperature, max_tokens, bool(json_mode)],
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Two-tier response cache: an in-memory LRU in front of a SQLite table with TTL and size eviction."""
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+                 ttl_sec: float = LLM_CACHE_TTL_SEC, max_rows: int = LLM_CACHE_MAX_ROWS):
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.ttl_sec = ttl_sec
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._puts = 0
+
+    def _db(self):
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(f"""CREATE TABLE IF NOT EXISTS {CACHE_TABLE_NAME} (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE_NAME}_last_used ON {CACHE_TABLE_NAME} (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, created: float, content: str):
+        self._memory[key] = (created, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Returns (content, tier) on a hit, where tier is "memory" or "disk", or (None, None) on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl_sec:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1], "memory"
+            self._memory.pop(key, None)
+
+            conn = self._db()
+            row = conn.execute(f"SELECT content, created FROM {CACHE_TABLE_NAME} WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] < self.ttl_sec:
+                conn.execute(f"UPDATE {CACHE_TABLE_NAME} SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self._remember(key, row[1], row[0])
+                self.hits += 1
+                return row[0], "disk"
+            if row:
+                conn.execute(f"DELETE FROM {CACHE_TABLE_NAME} WHERE key = ?", (key,))
+                conn.commit()
+            self.misses += 1
+            return None, None
+
+    def put(self, key: str, content: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, content)
+            conn = self._db()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {CACHE_TABLE_NAME} (key, content, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, now, now)
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY_N_PUTS == 0:
+                self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now: float):
+        conn.execute(f"DELETE FROM {CACHE_TABLE_NAME} WHERE created < ?", (now - self.ttl_sec,))
+        conn.execute(f"""DELETE FROM {CACHE_TABLE_NAME} WHERE key IN (
+            SELECT key FROM {CACHE_TABLE_NAME} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )""", (self.max_rows,))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+llm_cache = LLMCache()
@@ -1,9 +1,140 @@
 from config import OPENAI_API_KEY, OPENAI_API_URL, ANTHROPIC_API_KEY, ANTHROPIC_API_URL, GOOGLE_API_KEY, GOOGLE_API_URL
+from config import HTTP_TIMEOUT_SEC, HTTP_POOL_MAX_IDLE, HTTP_POOL_IDLE_TIMEOUT_SEC, LLM_CACHE_ENABLED, LLM_MAX_INFLIGHT_CALLS
+from config import LLM_MAX_ATTEMPTS, LLM_RETRY_MAX_DELAY_SEC, FAILOVER_MODELS, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES
+from config import PROMPT_CACHING
 from logger import log_event
-import urllib.request
+from llm_cache import llm_cache, make_cache_key
+from resilience import RETRYABLE_STATUSES, LatencyTracker, backoff_delay, breaker_for, parse_retry_after
+from scheduler import llm_scheduler, estimate_request_tokens, PRIORITY_BACKGROUND
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import tracing
+import contextvars
+import http.client
+import io
+import select
+import threading
+import time
 import urllib.error
+import urllib.parse
 import json
 
+class _HostPool:
+    """Keep-alive HTTP/1.1 connections to a single provider host."""
+
+    def __init__(self, scheme: str, host: str, port: int):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Returns (connection, reused). Idle connections past the idle timeout are dropped."""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < HTTP_POOL_IDLE_TIMEOUT_SEC and not _dropped(conn):
+                    return conn, True
+                conn.close()
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=HTTP_TIMEOUT_SEC)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=HTTP_TIMEOUT_SEC)
+        return conn, False
+
+    def release(self, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < HTTP_POOL_MAX_IDLE:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+def _dropped(conn):
+    """True if an idle connection was closed by the server: its socket is readable (EOF) before we sent anything."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_latencies = LatencyTracker()
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+_JSON_PREFILL = "{"
+
+class _CallFailed(Exception):
+    """One failed provider attempt. Retryable failures count against the provider's circuit breaker."""
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+def _get_pool(scheme: str, host: str, port: int):
+    key = (scheme, host, port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = _HostPool(scheme, host, port)
+        return pool
+
+def _open(url: str, headers: dict, data: bytes, trace_span=None):
+    """Sends a POST on a pooled connection and returns (pool, connection, response).
+
+    A reused connection that fails while the request is being sent was closed by the server before it read
+    anything, so the request is sent again on another connection. A failure after the request was sent is
+    raised: the provider may have run the completion, and the resilience layer decides whether to try again.
+    """
+    trace_span = trace_span or tracing.current_span()
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"unknown url type: {url!r}")
+    pool = _get_pool(parts.scheme, parts.hostname, parts.port)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    while True:
+        conn, reused = pool.acquire()
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+        except (http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if not reused:
+                raise urllib.error.URLError(e)
+            trace_span.add_retry()
+            continue
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+        try:
+            return pool, conn, conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+
+def _post(url: str, headers: dict, data: bytes):
+    """POSTs over the connection pool and returns the decoded body. Raises HTTPError/URLError like urlopen."""
+    pool, conn, response = _open(url, headers, data)
+    try:
+        body = response.read()
+    except (OSError, http.client.HTTPException) as e:
+        conn.close()
+        raise urllib.error.URLError(e)
+    pool.release(conn, response)
+
+    if response.status >= 400:
+        raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+    return body.decode('utf-8')
+
 def _get_provider(model: str):
     if "claude" in model:
         return "anthropic"
@@ -14,7 +145,8 @@ def _get_provider(model: str):
     else:
         return "none"
 
-def _build_request_params(provider: str, model: str, messages: list, temperature: float, max_tokens: int):
+def _build_request_params(provider: str, model: str, messages: list, temperature: float, max_tokens: int, stream: bool = False,
+                          json_mode: bool = False):
     if provider == "anthropic":
         url = ANTHROPIC_API_URL
         headers = {
@@ -29,6 +161,9 @@ def _build_request_params(provider: str, model: str, messages: list, temperature
                 system_message = msg["content"]
             else:
                 user_messages.append(msg)
+        if json_mode:
+            # Anthropic has no JSON mode; starting the answer with "{" keeps it from adding prose or fences.
+            user_messages.append({"role": "assistant", "content": _JSON_PREFILL})
 
         payload = {
             "model": model,
@@ -36,12 +171,25 @@ def _build_request_params(provider: str, model: str, messages: list, temperature
             "temperature": temperature,
             "max_tokens": max_tokens
         }
-        if system_message:
+        if system_message and PROMPT_CACHING:
+            # Everything up to and including the system prompt becomes a cacheable prefix. Prompts shorter than
+            # the model's minimum are simply not cached.
+            payload["system"] = [{"type": "text", "text": system_message, "cache_control": {"type": "ephemeral"}}]
+        elif system_message:
             payload["system"] = system_message
+        if stream:
+            payload["stream"] = True
         return url, headers, payload
 
     if provider == "google":
-        url = GOOGLE_API_URL.format(model=model) + f"?key={GOOGLE_API_KEY}"
+        url = GOOGLE_API_URL.format(model=model)
+        if stream:
+            if not url.endswith(":generateContent"):
+                raise _CallFailed(f"GOOGLE_API_URL must end with ':generateContent' to derive the streaming "
+                                  f"endpoint, got {GOOGLE_API_URL!r}")
+            url = url[:-len(":generateContent")] + f":streamGenerateContent?alt=sse&key={GOOGLE_API_KEY}"
+        else:
+            url += f"?key={GOOGLE_API_KEY}"
         headers = {"Content-Type": "application/json"}
         gemini_messages = []
         for msg in messages:
@@ -55,6 +203,8 @@ def _build_request_params(provider: str, model: str, messages: list, temperature
                 "maxOutputTokens": max_tokens
             }
         }
+        if json_mode:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
         return url, headers, payload
 
     if provider == "openai":
@@ -66,6 +216,11 @@ def _build_request_params(provider: str, model: str, messages: list, temperature
             "temperature": temperature,
             "max_tokens": max_tokens
         }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
         return url, headers, payload
     
     raise ValueError(f"Unsupported provider for model: {model}")
@@ -90,37 +245,365 @@ def _parse_response(provider: str, response_body: str):
 
     return result, None
 
-def chat_completion(model: str, messages: list, temperature: float, max_tokens: int = 800):
+def _usage_of(provider: str, result: dict):
+    """Returns the raw usage block of a response; Gemini reports it as usageMetadata."""
+    if provider == "google":
+        return result.get("usageMetadata", {})
+    return result.get("usage", {})
+
+def _extract_usage(provider: str, usage: dict):
+    """Normalizes a provider usage block to {"input_tokens", "output_tokens", "cached_tokens"}.
+
+    input_tokens counts the whole prompt; cached_tokens is the part served from the provider's prompt cache.
+    """
+    usage = usage or {}
+    if provider == "openai":
+        return {"input_tokens": usage.get("prompt_tokens", 0), "output_tokens": usage.get("completion_tokens", 0),
+                "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)}
+    if provider == "google":
+        return {"input_tokens": usage.get("promptTokenCount", 0), "output_tokens": usage.get("candidatesTokenCount", 0),
+                "cached_tokens": usage.get("cachedContentTokenCount", 0)}
+    # Anthropic reports cache reads and writes separately from the uncached input_tokens.
+    cache_read = usage.get("cache_read_input_tokens") or 0
+    cache_write = usage.get("cache_creation_input_tokens") or 0
+    return {"input_tokens": (usage.get("input_tokens") or 0) + cache_read + cache_write,
+            "output_tokens": usage.get("output_tokens", 0), "cached_tokens": cache_read}
+
+def _iter_sse_data(response):
+    """Yields the data payload of each server-sent event in the response body."""
+    data_lines = []
+    for raw_line in response:
+        line = raw_line.decode('utf-8').rstrip("\r\n")
+        if not line:
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+    if data_lines:
+        yield "\n".join(data_lines)
+
+def _parse_stream_event(provider: str, event: dict):
+    """Extracts (text_delta, usage) from one streamed event."""
+    if provider == "anthropic":
+        event_type = event.get("type")
+        if event_type == "error":
+            raise ValueError(event.get("error"))
+        if event_type == "content_block_delta":
+            return event.get("delta", {}).get("text"), None
+        if event_type == "message_start":
+            return None, event.get("message", {}).get("usage")
+        if event_type == "message_delta":
+            return None, event.get("usage")
+    elif provider == "google":
+        text = None
+        candidates = event.get("candidates", [])
+        if candidates and "content" in candidates[0]:
+            text = "".join(part.get("text", "") for part in candidates[0]["content"].get("parts", []))
+        return text, event.get("usageMetadata")
+    elif provider == "openai":
+        text = None
+        choices = event.get("choices")
+        if choices:
+            text = choices[0].get("delta", {}).get("content")
+        return text, event.get("usage")
+    return None, None
+
+def _candidates(model: str):
+    """The requested model followed by its configured failover model, if any."""
+    failover = FAILOVER_MODELS.get(model)
+    return [model, failover] if failover and failover != model else [model]
+
+def _choose_candidate(candidates: list, attempt: int):
+    """Rotates through the candidates by attempt, skipping providers whose circuit is open."""
+    offset = (attempt - 1) % len(candidates)
+    for candidate in candidates[offset:] + candidates[:offset]:
+        if breaker_for(_get_provider(candidate)).allow():
+            return candidate
+    return None
+
+def _record_failure(provider: str, model: str, error: _CallFailed, attempt: int):
+    """Updates the provider's breaker and returns how long to wait before retrying the same provider."""
+    breaker = breaker_for(provider)
+    if not error.retryable:
+        # The provider answered; the request itself was bad.
+        breaker.record_success()
+        return None
+    if breaker.record_failure():
+        log_event("llm_circuit_opened", {"provider": provider, "model": model, "error": str(error)})
+    return min(LLM_RETRY_MAX_DELAY_SEC, max(error.retry_after or 0.0, backoff_delay(attempt)))
+
+def _wait_before_retry(attempt: int, candidate: str, failed_model: str, delay: float, trace_span):
+    trace_span.add_retry()
+    # Switching to another provider does not need to wait out the failed one's backoff.
+    if delay and _get_provider(candidate) == _get_provider(failed_model):
+        time.sleep(delay)
+    if candidate != failed_model:
+        log_event("llm_failover", {"from": failed_model, "to": candidate, "attempt": attempt})
+
+def chat_completion_stream(model: str, messages: list, temperature: float, max_tokens: int = 800, cache: bool = None,
+                           priority: str = PRIORITY_BACKGROUND, json_mode: bool = False, cache_if=None):
+    """Yields text deltas as the provider produces them.
+
+    Errors are yielded as a final {"error": ...} dict, mirroring chat_completion. Caching follows chat_completion;
+    a cached completion is yielded as a single delta. Failed attempts are retried, or failed over, only until the
+    first delta has been yielded. `priority` is the scheduler class of the call.
+    """
+    provider = _get_provider(model)
+    # A generator can be closed from another context, so its span is never made current.
+    trace_span = tracing.start_span("llm", model=model, stream=True, priority=priority)
+    try:
+        key = None
+        if LLM_CACHE_ENABLED and (cache if cache is not None else temperature == 0):
+            key = make_cache_key(provider, model, messages, temperature, max_tokens, json_mode)
+            content, tier = llm_cache.get(key)
+            if content is not None:
+                log_event("llm_cache_hit", {"model": model, "tier": tier, **llm_cache.stats()})
+                trace_span.set(cache=tier)
+                yield content
+                return
+            log_event("llm_cache_miss", {"model": model, **llm_cache.stats()})
+            trace_span.set(cache="miss")
+
+        candidates = _candidates(model)
+        failed_model, delay, error = None, None, None
+        for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+            candidate = _choose_candidate(candidates, attempt)
+            if candidate is None:
+                break
+            if failed_model:
+                _wait_before_retry(attempt, candidate, failed_model, delay, trace_span)
+
+            parts = []
+            try:
+                tokens = estimate_request_tokens(messages, max_tokens)
+                with llm_scheduler.slot(_get_provider(candidate), candidate, tokens, priority) as ticket:
+                    trace_span.add_queue_time(ticket.wait_sec)
+                    for delta in _stream_completion(candidate, messages, temperature, max_tokens, trace_span, ticket,
+                                                    json_mode):
+                        parts.append(delta)
+                        yield delta
+            except _CallFailed as e:
+                delay = _record_failure(_get_provider(candidate), candidate, e, attempt)
+                failed_model, error = candidate, str(e)
+                if parts or delay is None or attempt == LLM_MAX_ATTEMPTS:
+                    trace_span.fail(e)
+                    yield {"error": str(e)}
+                    return
+                continue
+
+            breaker_for(_get_provider(candidate)).record_success()
+            if candidate != model:
+                trace_span.set(failover=candidate)
+            if key is not None and parts and (cache_if is None or cache_if("".join(parts))):
+                llm_cache.put(key, "".join(parts))
+            return
+
+        log_event("llm_circuit_open", {"model": model, "candidates": candidates})
+        error = error or f"Circuit open for every provider of {model}"
+        trace_span.fail(error)
+        yield {"error": error}
+    finally:
+        trace_span.finish()
 
+def _stream_completion(model: str, messages: list, temperature: float, max_tokens: int, trace_span, ticket,
+                       json_mode: bool = False):
+    """Yields the text deltas of one streamed attempt; raises _CallFailed on failure."""
     provider = _get_provider(model)
-    url, headers, payload = _build_request_params(provider, model, messages, temperature, max_tokens)
+    url, headers, payload = _build_request_params(provider, model, messages, temperature, max_tokens, stream=True,
+                                                  json_mode=json_mode)
+    prefill = _JSON_PREFILL if json_mode and provider == "anthropic" else ""
+    data_bytes = json.dumps(payload).encode('utf-8')
+    started = time.perf_counter()
+
+    try:
+        pool, conn, response = _open(url, headers, data_bytes, trace_span)
+    except urllib.error.URLError as e:
+        log_event("LLM API call failed with URL error", {"error": str(e.reason)})
+        raise _CallFailed(str(e.reason), retryable=True)
+
+    if response.status >= 400:
+        error_details = response.read().decode('utf-8')
+        pool.release(conn, response)
+        log_event("LLM API call failed with HTTP error", {"status_code": response.status, "error": error_details})
+        raise _CallFailed(f"HTTP Error {response.status}: {error_details}", retryable=response.status in RETRYABLE_STATUSES,
+                          retry_after=parse_retry_after(response.headers.get("Retry-After")))
+
+    usage = {}
+    finished = False
+    try:
+        for data in _iter_sse_data(response):
+            if data == "[DONE]":
+                continue
+            delta, event_usage = _parse_stream_event(provider, json.loads(data))
+            if event_usage:
+                usage.update(event_usage)
+            if delta:
+                if started is not None:
+                    trace_span.set(ttft_ms=round((time.perf_counter() - started) * 1000, 1))
+                    started = None
+                    delta = prefill + delta
+                yield delta
+        finished = True
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        log_event("LLM API stream failed", {"model": model, "error": str(e)})
+        raise _CallFailed(str(e), retryable=not isinstance(e, ValueError))
+    finally:
+        if finished:
+            pool.release(conn, response)
+        else:
+            conn.close()
+
+    tokens = _extract_usage(provider, usage)
+    trace_span.add_usage(**tokens)
+    ticket.used_tokens = tokens["input_tokens"] + tokens["output_tokens"] or None
+    log_event("LLM API call successful", {"model": model, "usage": usage, "cached_tokens": tokens["cached_tokens"],
+                                          "stream": True})
+
+def chat_completion(model: str, messages: list, temperature: float, max_tokens: int = 800, cache: bool = None,
+                    priority: str = PRIORITY_BACKGROUND, json_mode: bool = False, cache_if=None):
+    """Returns the completion text, or an {"error": ...} dict.
+
+    Responses are cached when `cache` is True, or when it is None and the call is deterministic (temperature 0).
+    `cache_if(text)`, if given, must also return True, so a response the caller cannot use is not replayed.
+    `priority` is the scheduler class: PRIORITY_CRITICAL for user-facing calls, PRIORITY_BACKGROUND otherwise.
+    `json_mode` asks the provider for a bare JSON object (response_format, responseMimeType or a "{" prefill).
+    """
+    provider = _get_provider(model)
+    with tracing.span("llm", model=model, priority=priority) as trace_span:
+        use_cache = LLM_CACHE_ENABLED and (cache if cache is not None else temperature == 0)
+        if not use_cache:
+            content = _resilient_completion(model, messages, temperature, max_tokens, priority, json_mode)
+        else:
+            key = make_cache_key(provider, model, messages, temperature, max_tokens, json_mode)
+            content, tier = llm_cache.get(key)
+            if content is not None:
+                log_event("llm_cache_hit", {"model": model, "tier": tier, **llm_cache.stats()})
+                trace_span.set(cache=tier)
+                return content
+
+            log_event("llm_cache_miss", {"model": model, **llm_cache.stats()})
+            trace_span.set(cache="miss")
+            content = _resilient_completion(model, messages, temperature, max_tokens, priority, json_mode)
+            if isinstance(content, str) and (cache_if is None or cache_if(content)):
+                llm_cache.put(key, content)
+
+        if isinstance(content, dict):
+            trace_span.fail(content.get("error"))
+        return content
+
+def _resilient_completion(model: str, messages: list, temperature: float, max_tokens: int, priority: str,
+                          json_mode: bool = False):
+    """Calls `model` with retries, failover to FAILOVER_MODELS and optional hedging.
+
+    Returns the content or an {"error": ...} dict.
+    """
+    trace_span = tracing.current_span()
+    candidates = _candidates(model)
+    failed_model, delay, error = None, None, None
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        candidate = _choose_candidate(candidates, attempt)
+        if candidate is None:
+            log_event("llm_circuit_open", {"model": model, "candidates": candidates})
+            return error or {"error": f"Circuit open for every provider of {model}"}
+        if failed_model:
+            _wait_before_retry(attempt, candidate, failed_model, delay, trace_span)
+
+        provider = _get_provider(candidate)
+        try:
+            content = _hedged_completion(provider, candidate, messages, temperature, max_tokens, priority, json_mode)
+        except _CallFailed as e:
+            error = {"error": str(e)}
+            delay = _record_failure(provider, candidate, e, attempt)
+            if delay is None:
+                return error
+            failed_model = candidate
+            continue
+
+        breaker_for(provider).record_success()
+        if candidate != model:
+            trace_span.set(failover=candidate)
+        return content
+    return error
+
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            # Primaries and hedges both wait for a scheduler slot, so twice the cap keeps them from queueing here.
+            _hedge_pool = ThreadPoolExecutor(max_workers=2 * LLM_MAX_INFLIGHT_CALLS, thread_name_prefix="llm-hedge")
+        return _hedge_pool
+
+def _hedged_completion(provider: str, model: str, messages: list, temperature: float, max_tokens: int, priority: str,
+                       json_mode: bool = False):
+    """Sends the request, and a second copy if the first outlives the model's LLM_HEDGE_PERCENTILE latency.
+
+    Returns the first successful content; raises _CallFailed if every copy failed.
+    """
+    hedge_after = None
+    if LLM_HEDGE_PERCENTILE:
+        hedge_after = _latencies.percentile(model, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    if hedge_after is None:
+        return _request_completion(provider, model, messages, temperature, max_tokens, priority, json_mode)
+
+    pool = _get_hedge_pool()
+    args = (_request_completion, provider, model, messages, temperature, max_tokens, priority, json_mode)
+    primary = pool.submit(contextvars.copy_context().run, *args)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    log_event("llm_hedge_sent", {"model": model, "after_ms": round(hedge_after * 1000, 1)})
+    tracing.current_span().set(hedged=True)
+    pending = {primary, pool.submit(contextvars.copy_context().run, *args)}
+    failure = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except _CallFailed as e:
+                failure = e
+    raise failure
+
+def _request_completion(provider: str, model: str, messages: list, temperature: float, max_tokens: int, priority: str,
+                        json_mode: bool = False):
+    """One attempt. Returns the content; raises _CallFailed on failure."""
+    url, headers, payload = _build_request_params(provider, model, messages, temperature, max_tokens, json_mode=json_mode)
 
     try:
         json_data_string = json.dumps(payload)
         
         data_bytes = json_data_string.encode('utf-8')
 
-        req = urllib.request.Request(url, data=data_bytes, headers=headers)
-
-        with urllib.request.urlopen(req) as response:
-            response_body = response.read().decode('utf-8')
+        trace_span = tracing.current_span()
+        with llm_scheduler.slot(provider, model, estimate_request_tokens(messages, max_tokens), priority) as ticket:
+            trace_span.add_queue_time(ticket.wait_sec)
+            started = time.perf_counter()
+            response_body = _post(url, headers, data_bytes)
+            _latencies.record(model, time.perf_counter() - started)
             result, content = _parse_response(provider, response_body)
+            usage = _usage_of(provider, result)
+            tokens = _extract_usage(provider, usage)
+            ticket.used_tokens = tokens["input_tokens"] + tokens["output_tokens"] or None
 
-            log_event("LLM API call successful", {"model": model, "usage": result.get("usage", {})})
-            if content:
-                return content
+        trace_span.add_usage(**tokens)
+        log_event("LLM API call successful", {"model": model, "usage": usage, "cached_tokens": tokens["cached_tokens"]})
+        if content:
+            if json_mode and provider == "anthropic":
+                content = _JSON_PREFILL + content
+            return content
 
-            error_message = "API response format is unexpected or content not found."
-            log_event("LLM API call failed", {"error": error_message, "response": result})
-            return {"error": error_message}
+        error_message = "API response format is unexpected or content not found."
+        log_event("LLM API call failed", {"error": error_message, "response": result})
+        raise _CallFailed(error_message)
             
     except urllib.error.HTTPError as e:
         error_details = e.read().decode('utf-8')
         log_event("LLM API call failed with HTTP error", {"status_code": e.code, "error": error_details})
-        return {"error": f"HTTP Error {e.code}: {error_details}"}
+        raise _CallFailed(f"HTTP Error {e.code}: {error_details}", retryable=e.code in RETRYABLE_STATUSES,
+                          retry_after=parse_retry_after(e.headers.get("Retry-After")))
         
     except urllib.error.URLError as e:
         log_event("LLM API call failed with URL error", {"error": str(e.reason)})
-        return {"error": str(e.reason)}
-    finally:
-         pass
\ No newline at end of file
+        raise _CallFailed(str(e.reason), retryable=True)
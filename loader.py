@@ -1,7 +1,11 @@
 import os
+import sys
 import json
+import time
+import threading
 import importlib.util
 from typing import Dict, List
+from config import REGISTRY_CHECK_INTERVAL_SEC, TOOL_MANIFEST_PATH
 
 AGENTS_DIR = "Agents"
 TOOLS_DIR = "Tools"
@@ -19,24 +23,202 @@ def load_agents() -> Dict[str, dict]:
     return agents
 
 
-def discover_tools() -> List[dict]:
+def _inspect_tool(module_path: str):
+    """Imports a tool module and returns its get_info() metadata, or None if it has none."""
+    package = os.path.basename(os.path.normpath(os.path.dirname(module_path)))
+    module_name = os.path.splitext(os.path.basename(module_path))[0]
+    spec = importlib.util.spec_from_file_location(f"{package}.{module_name}", module_path)
+    if spec and spec.loader:
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if hasattr(module, "get_info") and callable(getattr(module, "get_info")):
+            return module.get_info()
+    return None
+
+
+def _load_manifest(manifest_path: str) -> dict:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest_path: str, manifest: dict):
+    if os.path.dirname(manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def discover_tools(tools_dir: str = TOOLS_DIR, manifest_path: str = TOOL_MANIFEST_PATH) -> List[dict]:
+    """Returns each tool's get_info() metadata.
+
+    Metadata is cached in a manifest keyed on the tool's path, mtime and size, so only new or
+    changed tools are imported; the rest are imported lazily by the registry on first use.
+    """
     tools = []
-    if not os.path.isdir(TOOLS_DIR):
+    if not os.path.isdir(tools_dir):
         return tools
 
-    for filename in os.listdir(TOOLS_DIR):
+    manifest = _load_manifest(manifest_path) if manifest_path else {}
+    fresh_manifest = {}
+    changed = False
+
+    for entry in sorted(os.scandir(tools_dir), key=lambda e: e.name):
+        filename = entry.name
         if filename.endswith(".py") and not filename.startswith("__"):
-            module_name = os.path.splitext(filename)[0]
-            module_path = os.path.join(TOOLS_DIR, filename)
-            try:
-                spec = importlib.util.spec_from_file_location(f"Tools.{module_name}", module_path)
-                if spec and spec.loader:
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-                    if hasattr(module, "get_info") and callable(getattr(module, "get_info")):
-                        tool_info = module.get_info()
-                        tools.append(tool_info)
-            except Exception as e:
-                print(f"Warning: Could not load or inspect tool '{filename}'. Error: {e}")
+            module_path = os.path.join(tools_dir, filename)
+            stat = entry.stat()
+            cached = manifest.get(module_path)
+            if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                tool_info = cached["info"]
+            else:
+                changed = True
+                try:
+                    tool_info = _inspect_tool(module_path)
+                except Exception as e:
+                    print(f"Warning: Could not load or inspect tool '{filename}'. Error: {e}")
+                    continue
+            fresh_manifest[module_path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "info": tool_info}
+            if tool_info is not None:
+                tools.append(tool_info)
 
+    if manifest_path and (changed or len(fresh_manifest) != len(manifest)):
+        _save_manifest(manifest_path, fresh_manifest)
     return tools
+
+
+class Registry:
+    """Parsed agent configs and resolved tool callables.
+
+    An entry is reloaded only when its file's mtime changes, and mtimes are checked at most
+    once per `check_interval` seconds, so most lookups are a plain dict lookup. `version` changes when
+    an agent config changes or tools are added or removed, not when a tool module is reloaded.
+    """
+
+    def __init__(self, agents_dir: str = AGENTS_DIR, tools_dir: str = TOOLS_DIR,
+                 check_interval: float = REGISTRY_CHECK_INTERVAL_SEC):
+        self.agents_dir = agents_dir
+        self.tools_dir = tools_dir
+        self.check_interval = check_interval
+        self.version = 0
+        self._agents = {}
+        self._tools = {}
+        self._agents_listed_at = None
+        self._tool_names = None
+        self._tools_listed_at = None
+        self._lock = threading.Lock()
+
+    def _load_agent(self, name: str):
+        path = os.path.join(self.agents_dir, f"{name}.json")
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self._agents[name] = [mtime, time.monotonic(), config]
+        self.version += 1
+        return config
+
+    def get_agent(self, name: str) -> dict:
+        entry = self._agents.get(name)
+        if entry is not None and time.monotonic() - entry[1] < self.check_interval:
+            return entry[2]
+        with self._lock:
+            entry = self._agents.get(name)
+            if entry is not None:
+                mtime = os.stat(os.path.join(self.agents_dir, f"{name}.json")).st_mtime_ns
+                if mtime == entry[0]:
+                    entry[1] = time.monotonic()
+                    return entry[2]
+            return self._load_agent(name)
+
+    def list_agents(self) -> List[dict]:
+        """Returns every agent config, picking up added, edited and removed agent files."""
+        now = time.monotonic()
+        if self._agents_listed_at is None or now - self._agents_listed_at >= self.check_interval:
+            with self._lock:
+                names = set()
+                for entry in os.scandir(self.agents_dir):
+                    if not entry.name.endswith(".json"):
+                        continue
+                    name = os.path.splitext(entry.name)[0]
+                    names.add(name)
+                    cached = self._agents.get(name)
+                    if cached is None or cached[0] != entry.stat().st_mtime_ns:
+                        self._load_agent(name)
+                    else:
+                        cached[1] = now
+                for name in [name for name in self._agents if name not in names]:
+                    del self._agents[name]
+                    self.version += 1
+                self._agents_listed_at = now
+        return [entry[2] for _, entry in sorted(self._agents.items())]
+
+    def _check_tool_name(self, name: str):
+        """Raises KeyError unless `name` is one of the tool modules in tools_dir; called before any path is built
+        from it. The directory is rescanned at most once per `check_interval`."""
+        now = time.monotonic()
+        if self._tool_names is None or now - self._tools_listed_at >= self.check_interval:
+            with self._lock:
+                names = {entry.name[:-3] for entry in os.scandir(self.tools_dir)
+                         if entry.name.endswith(".py") and not entry.name.startswith("__")}
+                if self._tool_names is not None and names != self._tool_names:
+                    for removed in [name for name in self._tools if name not in names]:
+                        del self._tools[removed]
+                    self.version += 1
+                self._tool_names = names
+                self._tools_listed_at = now
+        if not isinstance(name, str) or not name.isidentifier() or name not in self._tool_names:
+            raise KeyError(f"Unknown tool: {name!r}")
+
+    def _load_tool(self, name: str, mtime: int):
+        package = os.path.basename(os.path.normpath(self.tools_dir))
+        spec = importlib.util.spec_from_file_location(f"{package}.{name}", os.path.join(self.tools_dir, f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[spec.name] = module
+        func = getattr(module, name)
+        get_info = getattr(module, "get_info", None)
+        info = get_info() if callable(get_info) else {"name": name}
+        self._tools[name] = [mtime, time.monotonic(), func, info]
+        return func, info
+
+    def get_tool(self, name: str):
+        """Returns (callable, info) for a tool, importing or reloading its module only when needed."""
+        self._check_tool_name(name)
+        entry = self._tools.get(name)
+        if entry is not None and time.monotonic() - entry[1] < self.check_interval:
+            return entry[2], entry[3]
+        with self._lock:
+            mtime = os.stat(os.path.join(self.tools_dir, f"{name}.py")).st_mtime_ns
+            entry = self._tools.get(name)
+            if entry is not None and entry[0] == mtime:
+                entry[1] = time.monotonic()
+                return entry[2], entry[3]
+            return self._load_tool(name, mtime)
+
+    def tool_source(self, name: str):
+        """Returns (module_path, mtime) of a tool's file without importing it, for running it in a worker."""
+        self._check_tool_name(name)
+        module_path = os.path.abspath(os.path.join(self.tools_dir, f"{name}.py"))
+        return module_path, os.stat(module_path).st_mtime_ns
+
+
+def build_registry(agents_dir: str = AGENTS_DIR, tools_dir: str = TOOLS_DIR) -> Registry:
+    registry = Registry(agents_dir, tools_dir)
+    registry.list_agents()
+    return registry
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+def default_registry() -> Registry:
+    """Process-wide registry over the default Agents/ and Tools/ directories."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = build_registry()
+        return _default_registry
@@ -2,9 +2,28 @@ import sqlite3
 import json
 import datetime
 import os
+import queue
+import sys
+import threading
+import time
+import atexit
+import itertools
 
 DB_FILE = "data/application.db"
 LOG_TABLE_NAME = "event_logs"
+SPAN_TABLE_NAME = "trace_spans"
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL_SEC = 0.5
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_STOP = object()
+
+_INSERT_EVENT = f"INSERT INTO {LOG_TABLE_NAME} (timestamp, kind, payload) VALUES (?, ?, ?)"
+_INSERT_SPAN = f"""INSERT OR REPLACE INTO {SPAN_TABLE_NAME}
+    (span_id, parent_id, turn_id, name, start_ts, wall_ms, queue_ms, retries, input_tokens, output_tokens, status, attrs)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
 
 def _get_db_connection():
     """
@@ -15,31 +34,134 @@ def _get_db_connection():
     conn = sqlite3.connect(DB_FILE)
     return conn
 
+def _create_table(conn):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {LOG_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL
+    )
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {SPAN_TABLE_NAME} (
+        span_id TEXT PRIMARY KEY,
+        parent_id TEXT,
+        turn_id TEXT,
+        name TEXT NOT NULL,
+        start_ts REAL NOT NULL,
+        wall_ms REAL NOT NULL,
+        queue_ms REAL NOT NULL DEFAULT 0,
+        retries INTEGER NOT NULL DEFAULT 0,
+        input_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        attrs TEXT NOT NULL
+    )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{LOG_TABLE_NAME}_kind ON {LOG_TABLE_NAME}(kind, id)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{SPAN_TABLE_NAME}_turn ON {SPAN_TABLE_NAME}(turn_id)")
+
 def init_log_db():
     """Initializes the event_logs table in the database if it doesn't exist."""
     with _get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {LOG_TABLE_NAME} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            kind TEXT NOT NULL,
-            payload TEXT NOT NULL
-        )
-        """)
+        conn.execute("PRAGMA journal_mode=WAL")
+        _create_table(conn)
         conn.commit()
 
+def _write_batch(conn, batch: list):
+    """Writes queued (statement, row) items, one executemany per run of the same statement."""
+    with conn:
+        for statement, items in itertools.groupby(batch, key=lambda item: item[0]):
+            conn.executemany(statement, [row for _, row in items])
+
+def _write_batch_safely(conn, batch: list):
+    """Writes a batch; a failure drops that batch and is reported on stderr, and the writer keeps running."""
+    try:
+        _write_batch(conn, batch)
+    except Exception as e:
+        print(f"log-writer: dropped {len(batch)} log item(s): {e!r}", file=sys.stderr)
+
+def _write_loop():
+    """Owns the only log connection; writes queued events in batches by size or age."""
+    conn = _get_db_connection()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _create_table(conn)
+    conn.commit()
+
+    batch = []
+    deadline = None
+    try:
+        while True:
+            try:
+                if batch:
+                    item = _queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    item = _queue.get()
+            except queue.Empty:
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                if batch:
+                    _write_batch_safely(conn, batch)
+                    batch = []
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + LOG_FLUSH_INTERVAL_SEC
+            if batch and (len(batch) >= LOG_BATCH_SIZE or time.monotonic() >= deadline):
+                _write_batch_safely(conn, batch)
+                batch = []
+    finally:
+        conn.close()
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+            _writer.start()
+
 def log_event(kind: str, payload: dict):
-    """Logs an event to the database."""
+    """Queues an event for the background writer. Never waits on disk I/O."""
     log_entry = (
         datetime.datetime.utcnow().isoformat(),
         kind,
         json.dumps(payload)
     )
-    with _get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"INSERT INTO {LOG_TABLE_NAME} (timestamp, kind, payload) VALUES (?, ?, ?)",
-            log_entry
-        )
-        conn.commit()
\ No newline at end of file
+    _ensure_writer()
+    _queue.put((_INSERT_EVENT, log_entry))
+
+def log_span(row: tuple):
+    """Queues a finished trace span row (see tracing.Span.row) for the background writer."""
+    _ensure_writer()
+    _queue.put((_INSERT_SPAN, row))
+
+def flush_logs(timeout: float = 5.0):
+    """Blocks until every event queued so far has been written."""
+    if _writer is None or not _writer.is_alive():
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+def shutdown_logger(timeout: float = 5.0):
+    """Writes any queued events and stops the background writer."""
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        return
+    _queue.put(_STOP)
+    _writer.join(timeout)
+    # A writer still draining after the timeout keeps its slot, so a second one cannot start beside it.
+    if not _writer.is_alive():
+        _writer = None
+
+atexit.register(shutdown_logger)
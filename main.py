@@ -1,18 +1,23 @@
-from loader import load_agents, discover_tools
-from planner import plan_with_retry
-from executor import execute_plan
-from responder import generate_final_response
-from memory import init_db, save_message
-from history_manager import build_context_for_planner
-from logger import log_event, init_log_db
-
-def main():
+import argparse
+from loader import build_registry, discover_tools
+from pipeline import run_turn
+from memory import init_db, memory_store
+from history_manager import ConversationHistory
+from logger import log_event, init_log_db, shutdown_logger
+from config import STREAM_RESPONSES
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interactive planner -> executor -> responder session.")
+    parser.add_argument("--session", help="Resume the conversation with this session id.")
+    args = parser.parse_args(argv)
+
     init_db()
     init_log_db()
-    available_agents = load_agents()
+    registry = build_registry()
     available_tools = discover_tools()
-    agent_list = list(available_agents.values())
-    conversation_history = []
+    conversation_history = ConversationHistory(args.session)
+    print(f"Session {conversation_history.session_id} ({len(conversation_history)} earlier turns). "
+          f"Resume with: python main.py --session {conversation_history.session_id}")
 
     try:
         while True:
@@ -20,41 +25,33 @@ def main():
             if not current_user_input:
                 continue
 
-            save_message(role="user", content=current_user_input, meta={"source": "cli"})
-
-            planner_input = build_context_for_planner(
-                conversation_history=conversation_history,
-                current_user_input=current_user_input
+            streamed = []
+
+            def print_delta(text):
+                if not streamed:
+                    print("\nAssistant: ", end="", flush=True)
+                streamed.append(text)
+                print(text, end="", flush=True)
+
+            final_response = run_turn(
+                current_user_input,
+                conversation_history,
+                registry,
+                available_tools,
+                on_delta=print_delta if STREAM_RESPONSES else None,
+                session_id=conversation_history.session_id
             )
 
-            plan = plan_with_retry(
-                user_input=planner_input,
-                available_agents=agent_list,
-                available_tools=available_tools
-            )
-
-            aggregated_results = execute_plan(plan, agents_dir="Agents", user_input=planner_input)
-
-            final_response = generate_final_response(
-                orchestrator_output=plan,
-                aggregated_results=aggregated_results,
-                current_user_input=current_user_input
-            )
-
-            save_message(role="assistant", content=final_response, meta={"plan": plan})
-            log_event(kind="session_complete", payload={"user_input": current_user_input, "response": final_response})
-
-            conversation_history.append({
-                "user_input": current_user_input,
-                "plan": plan,
-                "response": final_response,
-                "results": aggregated_results
-            })
-
-            print("\nAssistant:", final_response)
+            if streamed:
+                print()
+            if "".join(streamed) != final_response:
+                print("\nAssistant:", final_response)
     except KeyboardInterrupt:
         print("\nExiting gracefully. Goodbye!")
         log_event(kind="session_end", payload={"reason": "user_interrupt"})
+    finally:
+        memory_store.close()
+        shutdown_logger()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,38 +1,252 @@
 import sqlite3
 import json
+import datetime
+import re
+import threading
+from contextlib import contextmanager
 from config import DB_PATH
 
+_FTS_STOPWORDS = {
+    "the", "and", "for", "are", "was", "were", "you", "your", "with", "what", "how", "this", "that",
+    "can", "does", "did", "have", "has", "from", "about", "there", "their", "them", "will", "would",
+    "could", "should", "which", "when", "where", "who", "why", "not", "but", "all", "any", "its",
+}
+_FTS_MAX_TERMS = 16
+# Terms found in more than this share of a table's rows add little to the ranking but make bm25 scan most of the index.
+_FTS_MAX_TERM_SHARE = 0.02
+_FTS_MIN_TERM_DOCS = 500
+
+
+class MemoryStore:
+    """Persists messages and tool outputs over one long-lived WAL-mode connection.
+
+    Writes made inside `turn()` are buffered per thread and committed in a single transaction.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.fts_enabled = False
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def init_db(self):
+        with self._lock:
+            conn = self._db()
+            cur = conn.cursor()
+            cur.execute("""CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                role TEXT,
+                content TEXT,
+                meta TEXT,
+                ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+                session_id TEXT
+            )""")
+            cur.execute("""CREATE TABLE IF NOT EXISTS tool_outputs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tool_name TEXT,
+                output TEXT,
+                meta TEXT,
+                ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+                session_id TEXT
+            )""")
+            # Databases created before recall was scoped by session get the column; their old rows stay unscoped.
+            for table in ("messages", "tool_outputs"):
+                if "session_id" not in [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN session_id TEXT")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_tool_outputs_session ON tool_outputs (session_id)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_role ON messages (role)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_tool_outputs_ts ON tool_outputs (ts)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_tool_outputs_tool_name ON tool_outputs (tool_name)")
+            cur.execute("""CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                turn_index INTEGER,
+                user_input TEXT,
+                response TEXT,
+                plan TEXT,
+                results TEXT,
+                ts DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""")
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, turn_index)")
+            conn.commit()
+            self.fts_enabled = self._init_fts(cur)
+            conn.commit()
+
+    def _init_fts(self, cur):
+        """Creates external-content FTS5 indexes kept current by insert/delete triggers.
+
+        Existing rows are indexed once when an index is first created. Returns False if FTS5 is unavailable.
+        """
+        indexes = {
+            "messages": ("messages_fts", "content"),
+            "tool_outputs": ("tool_outputs_fts", "output"),
+        }
+        try:
+            for table, (fts_table, columns) in indexes.items():
+                exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts_table,)).fetchone()
+                cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({columns}, content='{table}', content_rowid='id')")
+                cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}_vocab USING fts5vocab({fts_table}, 'row')")
+                new_values = ", ".join(f"new.{c.strip()}" for c in columns.split(","))
+                old_values = ", ".join(f"old.{c.strip()}" for c in columns.split(","))
+                cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts_table} (rowid, {columns}) VALUES (new.id, {new_values});
+                END""")
+                cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                END""")
+                if not exists:
+                    cur.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    @contextmanager
+    def turn(self, session_id: str = None):
+        """Groups every write made on this thread until exit into one transaction.
+
+        Messages and tool outputs saved inside are recorded under `session_id`, which scopes recall().
+        """
+        if getattr(self._local, "pending", None) is not None:
+            yield
+            return
+        self._local.pending = []
+        self._local.session_id = session_id
+        try:
+            yield
+        finally:
+            pending, self._local.pending = self._local.pending, None
+            self._local.session_id = None
+            self._write(pending)
+
+    def _execute(self, sql: str, params: tuple):
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((sql, params))
+        else:
+            self._write([(sql, params)])
+
+    def _write(self, statements: list):
+        if not statements:
+            return
+        with self._lock:
+            conn = self._db()
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+
+    def save_message(self, role: str, content, meta: dict = None):
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        self._execute("INSERT INTO messages (role, content, meta, ts, session_id) VALUES (?, ?, ?, ?, ?)",
+                      (role, content, json.dumps(meta or {}), _now(), getattr(self._local, "session_id", None)))
+
+    def save_tool_output(self, tool_name: str, output, meta: dict = None):
+        self._execute("INSERT INTO tool_outputs (tool_name, output, meta, ts, session_id) VALUES (?, ?, ?, ?, ?)",
+                      (tool_name, json.dumps(output), json.dumps(meta or {}), _now(),
+                       getattr(self._local, "session_id", None)))
+
+    def save_turn(self, session_id: str, turn_index: int, user_input: str, response: str, plan, results):
+        self._execute("""INSERT OR REPLACE INTO turns (session_id, turn_index, user_input, response, plan, results, ts)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      (session_id, turn_index, user_input, response, json.dumps(plan, default=str),
+                       json.dumps(results, default=str), _now()))
+
+    def count_turns(self, session_id: str) -> int:
+        with self._lock:
+            row = self._db().execute("SELECT MAX(turn_index) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def load_turns(self, session_id: str, start: int, stop: int):
+        """Returns (user_input, plan, response, results) for turns start..stop-1 of a session, oldest first."""
+        with self._lock:
+            rows = self._db().execute(
+                """SELECT user_input, plan, response, results FROM turns
+                   WHERE session_id = ? AND turn_index >= ? AND turn_index < ? ORDER BY turn_index""",
+                (session_id, start, stop)
+            ).fetchall()
+        return [(user_input, json.loads(plan), response, json.loads(results)) for user_input, plan, response, results in rows]
+
+    def recall(self, text: str, limit: int = 5, session_id: str = None):
+        """Returns up to `limit` stored messages and tool outputs most relevant to `text`, best match first.
+
+        With a `session_id` only rows saved in that session's turns are searched.
+        """
+        if not self.fts_enabled:
+            return []
+        terms = []
+        for term in re.findall(r"\w+", text.lower()):
+            if len(term) > 2 and term not in _FTS_STOPWORDS and term not in terms:
+                terms.append(term)
+        terms = terms[:_FTS_MAX_TERMS]
+
+        scope, scope_params = ("AND r.session_id = ?", (session_id,)) if session_id is not None else ("", ())
+        with self._lock:
+            conn = self._db()
+            messages, tool_outputs = [], []
+            query = self._selective_query(conn, "messages", terms)
+            if query:
+                messages = conn.execute(f"""
+                    SELECT bm25(messages_fts) AS score, r.id, r.role, r.content, r.ts
+                    FROM messages_fts JOIN messages r ON r.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ? {scope} ORDER BY score LIMIT ?""",
+                    (query, *scope_params, limit)).fetchall()
+            query = self._selective_query(conn, "tool_outputs", terms)
+            if query:
+                tool_outputs = conn.execute(f"""
+                    SELECT bm25(tool_outputs_fts) AS score, r.id, r.tool_name, r.output, r.ts
+                    FROM tool_outputs_fts JOIN tool_outputs r ON r.id = tool_outputs_fts.rowid
+                    WHERE tool_outputs_fts MATCH ? {scope} ORDER BY score LIMIT ?""",
+                    (query, *scope_params, limit)).fetchall()
+
+        hits = [(score, {"source": "message", "id": row_id, "role": role, "content": content, "ts": ts})
+                for score, row_id, role, content, ts in messages]
+        hits += [(score, {"source": "tool", "id": row_id, "tool_name": tool_name, "content": output, "ts": ts})
+                 for score, row_id, tool_name, output, ts in tool_outputs]
+        hits.sort(key=lambda hit: hit[0])
+        return [hit for _, hit in hits[:limit]]
+
+    @staticmethod
+    def _selective_query(conn, table: str, terms: list):
+        """Builds an FTS OR-query from the terms that are indexed in `table` and not too common."""
+        placeholders = ", ".join("?" for _ in terms)
+        doc_counts = dict(conn.execute(
+            f"SELECT term, doc FROM {table}_fts_vocab WHERE term IN ({placeholders})", terms).fetchall())
+        if not doc_counts:
+            return ""
+        total_rows = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        max_docs = max(_FTS_MIN_TERM_DOCS, total_rows * _FTS_MAX_TERM_SHARE)
+        selective = [term for term in terms if 0 < doc_counts.get(term, 0) <= max_docs]
+        return " OR ".join(f'"{term}"' for term in selective)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _now():
+    # Same format as CURRENT_TIMESTAMP, taken when the write is made rather than when it is committed.
+    return datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+memory_store = MemoryStore()
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        role TEXT,
-        content TEXT,
-        meta TEXT,
-        ts DATETIME DEFAULT CURRENT_TIMESTAMP
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS tool_outputs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tool_name TEXT,
-        output TEXT,
-        meta TEXT,
-        ts DATETIME DEFAULT CURRENT_TIMESTAMP
-    )""")
-    conn.commit()
-    conn.close()
+    memory_store.init_db()
 
 def save_message(role: str, content: str, meta: dict = None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO messages (role, content, meta) VALUES (?, ?, ?)",
-                (role, content, json.dumps(meta or {})))
-    conn.commit(); conn.close()
+    memory_store.save_message(role, content, meta)
 
 def save_tool_output(tool_name: str, output, meta: dict = None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO tool_outputs (tool_name, output, meta) VALUES (?, ?, ?)",
-                (tool_name, json.dumps(output), json.dumps(meta or {})))
-    conn.commit()
-    conn.close()
+    memory_store.save_tool_output(tool_name, output, meta)
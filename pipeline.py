@@ -0,0 +1,140 @@
+from planner import plan_with_retry, stream_plan
+from executor import execute_plan, execute_streamed_plan
+from responder import generate_final_response
+from memory import save_message, memory_store
+from history_manager import Turn, build_context_for_planner
+from logger import log_event
+from config import PIPELINED_PLANNING, ROUTER_ENABLED, PLAN_OPTIMIZER_ENABLED
+from plan_optimizer import optimize_plan
+from router import router, ROUTE_CONVERSATIONAL, ROUTE_PLANNER
+import scheduler
+import time
+import tracing
+
+
+def _optimize(plan: dict, registry):
+    if not PLAN_OPTIMIZER_ENABLED or not plan.get("steps"):
+        return plan
+    with tracing.span("optimize") as trace_span:
+        fuse_agents = {agent.get("name") for agent in registry.list_agents() if agent.get("fuse")}
+        optimized, report = optimize_plan(plan, fuse_agents=fuse_agents)
+        trace_span.set(steps=report["steps_after"], llm_calls_saved=report["llm_calls_saved"],
+                       tool_calls_saved=report["tool_calls_saved"])
+    if report["steps_after"] != report["steps_before"] or report["fused"]:
+        log_event("plan_optimized", report)
+    return optimized
+
+def _execute(plan: dict, planner_input: str, registry, cancel_event=None):
+    if not plan.get("steps"):
+        return {}
+    with tracing.span("execute", steps=len(plan["steps"])):
+        return execute_plan(plan, user_input=planner_input, registry=registry, cancel_event=cancel_event)
+
+def _plan_then_execute(planner_input: str, registry, available_tools: list, request: str = None, cancel_event=None,
+                       standalone: bool = False):
+    with tracing.span("plan"):
+        started = time.perf_counter()
+        plan = plan_with_retry(
+            user_input=planner_input,
+            available_agents=registry.list_agents(),
+            available_tools=available_tools,
+            catalog_version=registry.version,
+            request=request,
+            standalone=standalone
+        )
+        if request is not None:
+            router.learn(request, plan, (time.perf_counter() - started) * 1000, standalone)
+
+    plan = _optimize(plan, registry)
+    return plan, _execute(plan, planner_input, registry, cancel_event)
+
+def _plan_and_execute_pipelined(planner_input: str, registry, available_tools: list, request: str = None,
+                                cancel_event=None, standalone: bool = False):
+    """Streams the plan and starts each step as soon as it can run.
+
+    Falls back to the sequential path, with its retries, only if the streamed plan failed before any step ran;
+    after that the steps that ran are answered from, with the planning error, instead of running them again.
+    """
+    available_agents = registry.list_agents()
+
+    def produce_plan(on_step):
+        with tracing.span("plan"):
+            started = time.perf_counter()
+            plan = stream_plan(planner_input, available_agents, available_tools, on_step,
+                               catalog_version=registry.version, request=request, standalone=standalone)
+            if request is not None:
+                router.learn(request, plan, (time.perf_counter() - started) * 1000, standalone)
+            return plan
+
+    try:
+        with tracing.span("plan_execute"):
+            return execute_streamed_plan(produce_plan, user_input=planner_input, registry=registry,
+                                         cancel_event=cancel_event)
+    except Exception as e:
+        log_event("pipelined_planning_failed", {"error": str(e)})
+    return _plan_then_execute(planner_input, registry, available_tools, request, cancel_event, standalone)
+
+
+def run_turn(current_user_input: str, conversation_history, registry, available_tools: list,
+             on_delta=None, source: str = "cli", context_builder=None, session_id: str = None,
+             cancel_event=None):
+    """Runs one planner -> executor -> responder turn and appends it to `conversation_history`
+    (a ConversationHistory, or a plain list of Turns).
+
+    All memory writes of the turn are committed together and recorded under `session_id` (default: the
+    history's), which scopes recall; its LLM calls queue fairly against other sessions under `session_id`
+    (default: `source`). Setting `cancel_event` (a threading.Event) kills the
+    turn's isolated tool calls that are still running. Returns the final response text.
+    """
+    memory_session = session_id or getattr(conversation_history, "session_id", None)
+    with tracing.turn(source=source), scheduler.session(session_id or source), memory_store.turn(memory_session):
+        save_message(role="user", content=current_user_input, meta={"source": source})
+
+        def build_context():
+            return build_context_for_planner(
+                conversation_history=conversation_history,
+                current_user_input=current_user_input,
+                context_builder=context_builder,
+                session_id=memory_session
+            )
+
+        # A first turn's plan does not depend on the conversation, so the router may learn and reuse it.
+        standalone = len(conversation_history) == 0
+        decision = None
+        if ROUTER_ENABLED:
+            with tracing.span("route") as trace_span:
+                decision = router.route(current_user_input, registry.list_agents(), available_tools, standalone)
+                trace_span.set(route=decision.route, reason=decision.reason)
+            router.maybe_audit(decision, current_user_input, build_context, registry.list_agents(), available_tools,
+                               standalone)
+
+        if decision is not None and decision.route == ROUTE_CONVERSATIONAL:
+            # Nothing to plan or run; the responder answers from the conversation alone.
+            plan, aggregated_results = decision.plan, {}
+        else:
+            with tracing.span("context"):
+                planner_input = build_context()
+            if decision is not None and decision.route != ROUTE_PLANNER:
+                plan = _optimize(decision.plan, registry)
+                plan, aggregated_results = plan, _execute(plan, planner_input, registry, cancel_event)
+            elif PIPELINED_PLANNING:
+                plan, aggregated_results = _plan_and_execute_pipelined(planner_input, registry, available_tools,
+                                                                       current_user_input, cancel_event, standalone)
+            else:
+                plan, aggregated_results = _plan_then_execute(planner_input, registry, available_tools,
+                                                              current_user_input, cancel_event, standalone)
+
+        with tracing.span("respond"):
+            final_response = generate_final_response(
+                orchestrator_output=plan,
+                aggregated_results=aggregated_results,
+                current_user_input=current_user_input,
+                on_delta=on_delta
+            )
+
+        save_message(role="assistant", content=final_response, meta={"plan": plan})
+        log_event(kind="session_complete", payload={"user_input": current_user_input, "response": final_response,
+                                                    "turn_id": tracing.current_turn_id()})
+
+        conversation_history.append(Turn(current_user_input, plan, final_response, aggregated_results))
+    return final_response
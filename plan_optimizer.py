@@ -0,0 +1,144 @@
+"""Rewrites a validated plan so the executor does less work for the same results.
+
+Passes, in order:
+  - drop steps that can never run: no id, a type the executor does not know, a dependency that is missing
+    or was dropped, or membership in a dependency cycle;
+  - merge tool steps with the same name and params, pointing `{sN}` placeholders and `depends_on` at the
+    step that is kept;
+  - fuse agent steps for the same agent that wait on exactly the same steps into one call of up to
+    PLAN_FUSE_MAX_STEPS tasks, for agents that opt in with `"fuse": true` (a fused call asks for a JSON
+    answer, which overrides the output format the agent's own prompt asks for). The fused step keeps the
+    first id and lists the others in `fused`; the executor splits the answer back into one result per
+    original id, so placeholders keep working.
+Every step result still reaches the responder, so a step is only dropped when it could not have run.
+"""
+import json
+import re
+from graphlib import TopologicalSorter, CycleError
+
+from config import PLAN_FUSE_MAX_STEPS
+
+_PLACEHOLDER = re.compile(r"\{([a-zA-Z0-9_]+)\}")
+_STEP_TYPES = ("tool", "agent")
+
+
+def _rewrite_placeholders(value, aliases: dict):
+    if isinstance(value, dict):
+        return {k: _rewrite_placeholders(v, aliases) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_placeholders(item, aliases) for item in value]
+    if isinstance(value, str):
+        return _PLACEHOLDER.sub(lambda m: "{" + aliases.get(m.group(1), m.group(1)) + "}", value)
+    return value
+
+def _rewrite_depends_on(depends_on: list, aliases: dict, own_id: str):
+    rewritten = []
+    for dep in depends_on:
+        dep = aliases.get(dep, dep)
+        if dep != own_id and dep not in rewritten:
+            rewritten.append(dep)
+    return rewritten
+
+
+def _drop_unrunnable(steps: list):
+    """Returns (runnable steps, number dropped)."""
+    kept, seen = [], set()
+    for step in steps:
+        if isinstance(step, dict) and step.get("id") and step.get("type") in _STEP_TYPES and step["id"] not in seen:
+            seen.add(step["id"])
+            kept.append(step)
+    while True:
+        ids = {step["id"] for step in kept}
+        runnable = [step for step in kept if set(step.get("depends_on", [])) <= ids]
+        try:
+            TopologicalSorter({step["id"]: set(step.get("depends_on", [])) for step in runnable}).prepare()
+        except CycleError as e:
+            cycle = set(e.args[1])
+            runnable = [step for step in runnable if step["id"] not in cycle]
+        if len(runnable) == len(kept):
+            return kept, len(steps) - len(kept)
+        kept = runnable
+
+def _dedupe_tools(steps: list):
+    """Returns (steps, number merged). Steps are visited in dependency order so merges cascade downstream."""
+    by_id = {step["id"]: step for step in steps}
+    order = TopologicalSorter({step["id"]: set(step.get("depends_on", [])) for step in steps}).static_order()
+    aliases, kept_by_key = {}, {}
+    for step_id in order:
+        step = by_id[step_id]
+        step["params"] = _rewrite_placeholders(step.get("params", {}), aliases)
+        if "depends_on" in step:
+            step["depends_on"] = _rewrite_depends_on(step["depends_on"], aliases, step_id)
+        if step["type"] != "tool":
+            continue
+        key = (step.get("name"), json.dumps(step["params"], sort_keys=True, default=str))
+        if key in kept_by_key:
+            aliases[step_id] = kept_by_key[key]
+        else:
+            kept_by_key[key] = step_id
+    return [step for step in steps if step["id"] not in aliases], len(aliases)
+
+def _fuse_agents(steps: list, max_steps: int, fuse_agents):
+    """Returns (steps, number of agent calls saved)."""
+    if max_steps < 2 or not fuse_agents:
+        return steps, 0
+    step_ids = {step["id"] for step in steps}
+    groups = {}
+    for step in steps:
+        # A placeholder outside depends_on would be read before its step ran; leave such steps alone.
+        referenced = set(_PLACEHOLDER.findall(json.dumps(step.get("params", {})))) & step_ids
+        if (step["type"] == "agent" and step.get("name") in fuse_agents and not step.get("fused")
+                and referenced <= set(step.get("depends_on", []))):
+            key = (step.get("name"), frozenset(step.get("depends_on", [])))
+            groups.setdefault(key, []).append(step)
+
+    aliases, fused_steps = {}, {}
+    for group in groups.values():
+        for start in range(0, len(group), max_steps):
+            chunk = group[start:start + max_steps]
+            if len(chunk) < 2:
+                continue
+            first = chunk[0]
+            fused = {key: value for key, value in first.items() if key not in ("params", "fused")}
+            fused["params"] = {step["id"]: step.get("params", {}) for step in chunk}
+            fused["fused"] = [step["id"] for step in chunk]
+            fused_steps[first["id"]] = fused
+            for step in chunk[1:]:
+                aliases[step["id"]] = first["id"]
+    if not aliases:
+        return steps, 0
+
+    # Placeholders still name the original ids, whose results the executor fills in; only ordering moves.
+    optimized = []
+    for step in steps:
+        if step["id"] in aliases:
+            continue
+        step = fused_steps.get(step["id"], step)
+        if "depends_on" in step:
+            step["depends_on"] = _rewrite_depends_on(step["depends_on"], aliases, step["id"])
+        optimized.append(step)
+    return optimized, len(aliases)
+
+
+def optimize_plan(plan: dict, fuse_max_steps: int = PLAN_FUSE_MAX_STEPS, fuse_agents=()):
+    """Returns (optimized plan, report). The input plan is not modified.
+
+    Only agents named in `fuse_agents` are fused.
+
+    The report counts steps before and after, steps dropped, merged and fused, and the tool and LLM calls saved.
+    """
+    steps = json.loads(json.dumps(plan.get("steps", []), default=str))
+    steps_before = len(steps)
+    steps, dropped = _drop_unrunnable(steps)
+    steps, merged = _dedupe_tools(steps)
+    steps, fused = _fuse_agents(steps, fuse_max_steps, fuse_agents)
+    report = {
+        "steps_before": steps_before,
+        "steps_after": len(steps),
+        "dropped": dropped,
+        "merged": merged,
+        "fused": fused,
+        "tool_calls_saved": merged,
+        "llm_calls_saved": fused,
+    }
+    return {**plan, "steps": steps}, report
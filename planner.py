@@ -1,12 +1,15 @@
 import json
-import time
-from llm_client import chat_completion
-from config import PLANNER_MODEL, DEFAULT_TEMPERATURE, MAX_RETRIES, RETRY_BACKOFF_SEC
+import re
+import threading
+from llm_client import chat_completion, chat_completion_stream
+from config import PLANNER_MODEL, DEFAULT_TEMPERATURE, MAX_RETRIES, PLANNER_JSON_MODE
+from executor import validate_plan_graph
 from logger import log_event
+from scheduler import PRIORITY_CRITICAL
+import tracing
 
 
-def build_planner_prompt(user_input: str, available_agents: list, available_tools: list):
-    system_prompt = """You are a master planner AI. Your job is to create a step-by-step plan to fulfill the user's request using a set of available agents and tools.
+PLANNER_SYSTEM_PROMPT = """You are a master planner AI. Your job is to create a step-by-step plan to fulfill the user's request using a set of available agents and tools.
 You must respond with ONLY a valid JSON object. Do not include any other text, explanations, or markdown formatting.
 
 Your output JSON must have this structure:
@@ -39,6 +42,19 @@ Your output JSON must have this structure:
 6.  **Execution Order**: The order of steps in the `steps` array does NOT matter. The `executor` will determine the correct order from the `depends_on` field. Focus only on defining the dependencies correctly.
 7.  **Resource Analysis**: Carefully analyze the provided agent and tool descriptions to create the most logical and efficient plan.
 """
+
+_catalog_memo = None
+_catalog_lock = threading.Lock()
+
+
+def render_catalog(available_agents: list, catalog_version=None):
+    """Renders the agent and tool catalog, memoized per registry version (and the agent configs themselves)."""
+    global _catalog_memo
+    key = (catalog_version, tuple(id(agent) for agent in available_agents))
+    memo = _catalog_memo
+    if memo is not None and memo[0] == key:
+        return memo[2]
+
     agents_text_parts = []
     for agent in available_agents:
         agent_info = f"- Agent: {agent.get('name', '')}\n  Description: {agent.get('description', '')}"
@@ -53,36 +69,348 @@ Your output JSON must have this structure:
     if not agents_text:
         agents_text = "No available agents."
 
-    prompt = f"""This is the conversation context:
-{user_input}
-
----
+    catalog = f"""---
 Here are the resources you can use to fulfill the CURRENT USER REQUEST:
 
 Available agents and their related tools:
 {agents_text}
+"""
+    with _catalog_lock:
+        # The agent list is kept with the key so the ids in it cannot be reused while memoized.
+        _catalog_memo = (key, list(available_agents), catalog)
+    return catalog
+
 
+def build_planner_prompt(user_input: str, available_agents: list, available_tools: list, catalog_version=None):
+    """Returns (prompt, system_prompt).
+
+    The system prompt holds everything that only changes with the registry (instructions, then the catalog) so
+    providers can reuse it as a cached prefix; the prompt holds the conversation context.
+    """
+    system_prompt = PLANNER_SYSTEM_PROMPT + "\n" + render_catalog(available_agents, catalog_version)
+    prompt = f"""This is the conversation context:
+{user_input}
 """
     return prompt, system_prompt
 
 
-def plan_with_retry(user_input: str, available_agents: list, available_tools: list):
-    prompt, system_prompt = build_planner_prompt(user_input, available_agents, available_tools)
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_PLACEHOLDER = re.compile(r"\{([a-zA-Z0-9_]+)\}")
+# Strings are matched first so commas inside them are left alone.
+_TRAILING_COMMA = re.compile(r'"(?:\\.|[^"\\])*"|,(\s*[}\]])')
+
+
+def _scan_json(text: str, start: int):
+    """Walks the JSON value starting at `start`, skipping strings; returns the index after it closes, or None."""
+    depth = 0
+    in_string = escaped = False
+    for pos in range(start, len(text)):
+        ch = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return None
+
+def _strip_trailing_commas(text: str):
+    return _TRAILING_COMMA.sub(lambda m: m.group(0) if m.group(1) is None else m.group(1), text)
+
+def _add_placeholder_dependencies(steps: list):
+    """Adds steps referenced by a `{step_id}` placeholder to `depends_on`; returns how many were added."""
+    step_ids = {step.get("id") for step in steps if isinstance(step, dict)}
+    added = 0
+    for step in steps:
+        if not isinstance(step, dict):
+            continue
+        depends_on = step.get("depends_on")
+        if depends_on is None:
+            depends_on = []
+        if not isinstance(depends_on, list):
+            continue
+        referenced = _PLACEHOLDER.findall(json.dumps(step.get("params", {})))
+        for ref in referenced:
+            if ref in step_ids and ref != step.get("id") and ref not in depends_on:
+                depends_on.append(ref)
+                added += 1
+        if depends_on:
+            step["depends_on"] = depends_on
+    return added
+
+def _add_placeholder_dependencies_on(step: dict, step_ids: set):
+    """Like _add_placeholder_dependencies for one streamed step, against the ids of the steps streamed so far."""
+    depends_on = step.get("depends_on") or []
+    for ref in _PLACEHOLDER.findall(json.dumps(step.get("params", {}))):
+        if ref in step_ids and ref != step.get("id") and ref not in depends_on:
+            depends_on.append(ref)
+    if depends_on:
+        step["depends_on"] = depends_on
+
+def _release_streamed_steps(held: list, seen_ids: set, on_step):
+    """Hands on each held step whose placeholders all name steps already streamed; returns the ones still held."""
+    still_held = []
+    for step in held:
+        if set(_PLACEHOLDER.findall(json.dumps(step.get("params", {})))) - {"initial_request"} <= seen_ids:
+            _add_placeholder_dependencies_on(step, seen_ids)
+            on_step(step)
+        else:
+            still_held.append(step)
+    return still_held
+
+def parse_plan(text: str):
+    """Parses a planner response, repairing the usual slips locally instead of asking the model again.
+
+    Handles markdown fences, prose around the JSON object, trailing commas, and placeholders missing from
+    `depends_on`. Returns (plan, repairs) where repairs names what was fixed; raises ValueError if the text
+    cannot be turned into a plan.
+    """
+    repairs = []
+    try:
+        plan = json.loads(text)
+    except ValueError:
+        fenced = _FENCE.search(text)
+        if fenced:
+            text = fenced.group(1)
+            repairs.append("fence")
+        start, end = text.find("{"), None
+        while start >= 0:
+            end = _scan_json(text, start)
+            if end is not None:
+                break
+            start = text.find("{", start + 1)
+        if end is None:
+            raise ValueError("Planner response contains no complete JSON object")
+        if text[:start].strip() or text[end:].strip():
+            repairs.append("extract")
+        text = text[start:end]
+        try:
+            plan = json.loads(text)
+        except ValueError:
+            plan = json.loads(_strip_trailing_commas(text))
+            repairs.append("trailing_comma")
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps"), list):
+        raise ValueError("Planner returned JSON missing 'steps' list")
+    if _add_placeholder_dependencies(plan["steps"]):
+        repairs.append("depends_on")
+    return plan, repairs
+
+def _catalog_names(available_agents: list, available_tools: list):
+    agent_names = {agent.get("name") for agent in available_agents}
+    tool_names = {tool.get("name") for tool in available_tools}
+    for agent in available_agents:
+        tool_names.update(tool.get("name") for tool in agent.get("related_tools", []))
+    return agent_names, tool_names
+
+def _step_problems(step, index: int, agent_names: set, tool_names: set, seen_ids: set):
+    """Checks one step's id, type, name against the catalog, and field types; adds its id to `seen_ids`."""
+    if not isinstance(step, dict):
+        return [f"step {index} is not an object"]
+    problems = []
+    step_id = step.get("id")
+    if not isinstance(step_id, str) or not step_id:
+        problems.append(f"step {index} has no id")
+    elif step_id in seen_ids:
+        problems.append(f"duplicate step id '{step_id}'")
+    seen_ids.add(step_id)
+    step_type, name = step.get("type"), step.get("name")
+    if step_type == "agent" and name not in agent_names:
+        problems.append(f"step '{step_id}' uses unknown agent '{name}'")
+    elif step_type == "tool" and name not in tool_names:
+        problems.append(f"step '{step_id}' uses unknown tool '{name}'")
+    elif step_type not in ("agent", "tool"):
+        problems.append(f"step '{step_id}' has invalid type '{step_type}'")
+    if not isinstance(step.get("params", {}), dict):
+        problems.append(f"step '{step_id}' params must be an object")
+    if not isinstance(step.get("depends_on", []), list):
+        problems.append(f"step '{step_id}' depends_on must be a list")
+    return problems
+
+def validate_plan(plan: dict, available_agents: list, available_tools: list):
+    """Checks step ids, types, names against the catalog, and dependencies. Returns a list of problems."""
+    agent_names, tool_names = _catalog_names(available_agents, available_tools)
+    problems = []
+    seen_ids = set()
+    for index, step in enumerate(plan["steps"]):
+        problems.extend(_step_problems(step, index, agent_names, tool_names, seen_ids))
+    if not problems:
+        graph_error = validate_plan_graph(plan["steps"])
+        if graph_error:
+            problems.append(graph_error["error"])
+    return problems
+
+def _checked_plan(text, available_agents: list, available_tools: list):
+    """Returns (plan, repairs) for a planner response; raises ValueError if it is not a usable plan."""
+    if isinstance(text, dict):
+        raise RuntimeError(text.get("error", "Unknown error from LLM."))
+    plan, repairs = parse_plan(text)
+    problems = validate_plan(plan, available_agents, available_tools)
+    if problems:
+        raise ValueError("Invalid plan: " + "; ".join(problems[:5]))
+    return plan, repairs
+
+
+def _plan_check(available_agents: list, available_tools: list):
+    """A cache_if for planner calls: only responses _checked_plan accepts are cached."""
+    def usable(text):
+        try:
+            _checked_plan(text, available_agents, available_tools)
+        except Exception:
+            return False
+        return True
+    return usable
+
+
+def plan_with_retry(user_input: str, available_agents: list, available_tools: list, catalog_version=None,
+                    request: str = None, standalone: bool = False):
+    """Plans with up to MAX_RETRIES planner calls.
+
+    Only unusable output is retried, answered immediately with a correction request. An LLM failure is
+    raised at once: chat_completion has already retried it with backoff.
+    `request` is the user's message on its own, logged with the plan so the router can learn from it;
+    `standalone` marks a request planned without earlier turns, whose plan the router may reuse.
+    """
+    prompt, system_prompt = build_planner_prompt(user_input, available_agents, available_tools, catalog_version)
     messages = [{"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}]
+    usable_plan = _plan_check(available_agents, available_tools)
     last_exc = None
 
-    
     for attempt in range(1, MAX_RETRIES+1):
+        if attempt > 1:
+            tracing.current_span().add_retry()
+        with tracing.span("plan.attempt", attempt=attempt) as trace_span:
+            text = None
+            try:
+                text = chat_completion(model=PLANNER_MODEL, messages=messages, temperature=DEFAULT_TEMPERATURE,
+                                       priority=PRIORITY_CRITICAL, json_mode=PLANNER_JSON_MODE,
+                                       cache_if=usable_plan)
+                plan, repairs = _checked_plan(text, available_agents, available_tools)
+                log_event("planner_ok", {"plan": plan, "attempt": attempt, "repairs": repairs, "request": request,
+                                          "standalone": standalone})
+                trace_span.set(steps=len(plan["steps"]), repairs=repairs)
+                return plan
+            except Exception as e:
+                last_exc = e
+                trace_span.fail(e)
+                log_event("planner_error", {"attempt": attempt, "error": str(e),
+                                            "stage": "llm" if not isinstance(text, str) else "plan"})
+        if attempt == MAX_RETRIES or not isinstance(text, str):
+            break
+        messages = messages[:2] + [
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": f"That response was not a usable plan ({last_exc}). "
+                                        "Reply with the corrected JSON object only."}
+        ]
+    raise last_exc
+
+
+class PlanStreamParser:
+    """Incrementally extracts complete step objects from a planner response as it streams in."""
+    _STEPS_START = re.compile(r'"steps"\s*:\s*\[')
+
+    def __init__(self):
+        self.text = ""
+        self._pos = None
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped = False
+        self._closed = False
+
+    def feed(self, chunk: str) -> list:
+        """Appends a chunk and returns the steps completed by it."""
+        self.text += chunk
+        if self._pos is None:
+            match = self._STEPS_START.search(self.text)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        steps = []
+        text = self.text
+        while self._pos < len(text) and not self._closed:
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    self._closed = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            step = json.loads(text[self._start:self._pos + 1])
+                        except ValueError:
+                            step = None
+                        if isinstance(step, dict):
+                            steps.append(step)
+            self._pos += 1
+        return steps
+
+
+def stream_plan(user_input: str, available_agents: list, available_tools: list, on_step, catalog_version=None,
+                request: str = None, standalone: bool = False):
+    """Streams a single planner completion, calling `on_step(step)` as soon as each step is complete.
+
+    Each step is checked against the catalog before it is handed on, and gets `depends_on` entries for the
+    steps its placeholders reference. A step that references a step not yet streamed is held back until that
+    step arrives; placeholders that never name a step are left as text, as parse_plan does. Returns the full plan. Raises ValueError, and stops the stream,
+    at the first invalid step or if the response is not a valid plan; there is no retry here.
+    """
+    prompt, system_prompt = build_planner_prompt(user_input, available_agents, available_tools, catalog_version)
+    messages = [{"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}]
+    parser = PlanStreamParser()
+    agent_names, tool_names = _catalog_names(available_agents, available_tools)
+    seen_ids = set()
+    held = []
+
+    with tracing.span("plan.attempt", attempt=1, stream=True) as trace_span:
+        stream = chat_completion_stream(model=PLANNER_MODEL, messages=messages, temperature=DEFAULT_TEMPERATURE,
+                                        priority=PRIORITY_CRITICAL, json_mode=PLANNER_JSON_MODE,
+                                        cache_if=_plan_check(available_agents, available_tools))
         try:
-            text = chat_completion(model=PLANNER_MODEL, messages=messages, temperature=DEFAULT_TEMPERATURE)
-            plan = json.loads(text)
-            if "steps" not in plan or not isinstance(plan["steps"], list):
-                raise ValueError("Planner returned JSON missing 'steps' list")
-            log_event("planner_ok", {"plan": plan})
-            return plan
+            for delta in stream:
+                if isinstance(delta, dict):
+                    raise ValueError(delta.get("error", "Unknown error from LLM."))
+                for step in parser.feed(delta):
+                    problems = _step_problems(step, len(seen_ids), agent_names, tool_names, seen_ids)
+                    if problems:
+                        raise ValueError("Invalid plan: " + "; ".join(problems[:5]))
+                    held = _release_streamed_steps(held + [step], seen_ids, on_step)
+            plan, repairs = _checked_plan(parser.text, available_agents, available_tools)
+            for step in held:
+                _add_placeholder_dependencies_on(step, seen_ids)
+                on_step(step)
         except Exception as e:
-            last_exc = e
-            log_event("planner_error", {"attempt": attempt, "error": str(e)})
-            time.sleep(RETRY_BACKOFF_SEC * attempt)
-    raise last_exc
\ No newline at end of file
+            trace_span.fail(e)
+            log_event("planner_error", {"attempt": 1, "error": str(e), "streamed": True})
+            raise
+        finally:
+            # Ends the HTTP stream now rather than when the generator is collected.
+            stream.close()
+        log_event("planner_ok", {"plan": plan, "attempt": 1, "repairs": repairs, "request": request,
+                                 "standalone": standalone, "streamed": True})
+        trace_span.set(steps=len(plan["steps"]), repairs=repairs)
+        return plan
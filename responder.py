@@ -1,12 +1,24 @@
 import logging
-from llm_client import chat_completion
+from llm_client import chat_completion, chat_completion_stream
 from config import RESPONDER_MODEL, DEFAULT_TEMPERATURE
+from scheduler import PRIORITY_CRITICAL
+from step_params import render_result
 
-def generate_final_response(orchestrator_output, aggregated_results, current_user_input):
+def _stream_completion(messages: list, on_delta):
+    parts = []
+    for delta in chat_completion_stream(model=RESPONDER_MODEL, messages=messages, temperature=DEFAULT_TEMPERATURE, max_tokens=500,
+                                        priority=PRIORITY_CRITICAL):
+        if isinstance(delta, dict):
+            return delta
+        parts.append(delta)
+        on_delta(delta)
+    return "".join(parts)
+
+def generate_final_response(orchestrator_output, aggregated_results, current_user_input, on_delta=None):
 
     try:
         results_text = "\n".join([
-            f"- Step {step}: {result}"
+            f"- Step {step}: {render_result(result)}"
             for step, result in aggregated_results.items()
         ])
 
@@ -38,12 +50,16 @@ def generate_final_response(orchestrator_output, aggregated_results, current_use
             {"role": "user", "content": user_prompt}
         ]
 
-        response = chat_completion(
-            model= RESPONDER_MODEL,
-            messages=messages,
-            temperature=DEFAULT_TEMPERATURE,
-            max_tokens=500
-        )
+        if on_delta is None:
+            response = chat_completion(
+                model= RESPONDER_MODEL,
+                messages=messages,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=500,
+                priority=PRIORITY_CRITICAL
+            )
+        else:
+            response = _stream_completion(messages, on_delta)
 
         if isinstance(response, dict):
             error_message = response.get("error", "Unknown error from LLM.")
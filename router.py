@@ -0,0 +1,262 @@
+"""Routes a turn before any LLM call: straight to the responder, to a known plan, or to the planner.
+
+Decisions come from three cheap checks, in order:
+  - rules: greetings, thanks and goodbyes are conversational;
+  - templates: a request whose planner output was the same plan ROUTER_TEMPLATE_MIN_COUNT times in a row
+    reuses that plan, as long as it still validates against the catalog. Only standalone turns, the first
+    of their session, are learned from or served, since a follow-up's plan depends on the conversation;
+  - a word/bigram Naive Bayes model of "planner returned no steps", trained on logged `planner_ok`
+    events, routes to the responder when it is at least ROUTER_CONFIDENCE sure.
+Everything else goes to the planner. Each decision is logged as `route_decision`; with ROUTER_SHADOW_RATE
+set, a share of the fast-pathed turns also runs the planner in the background and logs `route_audit`.
+
+Run `python router.py` for decision counts, time saved and audit agreement.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import logger
+from config import (ROUTER_CONFIDENCE, ROUTER_MIN_SAMPLES, ROUTER_TEMPLATE_MIN_COUNT, ROUTER_TRAINING_EVENTS,
+                    ROUTER_SHADOW_RATE)
+from logger import log_event
+from planner import plan_with_retry, validate_plan
+
+ROUTE_CONVERSATIONAL = "conversational"
+ROUTE_TEMPLATE = "template"
+ROUTE_PLANNER = "planner"
+
+_CONVERSATIONAL = re.compile(
+    r"^\s*(hi|hello|hey|yo|howdy|good (morning|afternoon|evening|night)|thanks?( you)?( (so|very) much| a lot)?|"
+    r"thx|ty|cheers|great,? thanks|bye|goodbye|see you( later)?|merhaba|selam|te[sş]ekk[uü]rler|"
+    r"te[sş]ekk[uü]r ederim|sa[gğ] ?ol)( there| again)?\s*[!.,:)]*\s*$",
+    re.IGNORECASE
+)
+_WORD = re.compile(r"\w+", re.UNICODE)
+_LABEL_EMPTY = "empty"
+_LABEL_STEPS = "steps"
+
+
+def normalize_request(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+def _features(text: str) -> list:
+    words = _WORD.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayes:
+    """Multinomial Naive Bayes over word unigrams and bigrams, with add-one smoothing."""
+
+    def __init__(self):
+        self.class_counts = Counter()
+        self.feature_counts = {}
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+
+    @property
+    def samples(self):
+        return sum(self.class_counts.values())
+
+    def learn(self, text: str, label: str):
+        features = _features(text)
+        self.class_counts[label] += 1
+        self.feature_counts.setdefault(label, Counter()).update(features)
+        self.feature_totals[label] += len(features)
+        self.vocabulary.update(features)
+
+    def predict(self, text: str):
+        """Returns (label, probability) for the most likely label, or (None, 0.0) before any training."""
+        if not self.class_counts:
+            return None, 0.0
+        features = _features(text)
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, count in self.class_counts.items():
+            counts = self.feature_counts[label]
+            denominator = self.feature_totals[label] + vocabulary_size
+            score = math.log(count / self.samples)
+            for feature in features:
+                score += math.log((counts[feature] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / total
+
+
+class RouteDecision:
+    __slots__ = ("route", "plan", "reason", "confidence")
+
+    def __init__(self, route: str, plan: dict = None, reason: str = "", confidence: float = 1.0):
+        self.route = route
+        self.plan = plan
+        self.reason = reason
+        self.confidence = confidence
+
+
+class Router:
+    def __init__(self, db_file: str = None, training_events: int = ROUTER_TRAINING_EVENTS):
+        self.db_file = db_file
+        self.training_events = training_events
+        self.model = NaiveBayes()
+        self._templates = {}
+        self._plan_ms = None
+        self._trained = False
+        self._lock = threading.Lock()
+
+    def _ensure_trained(self):
+        """Trains on the most recent `planner_ok` events the first time a decision is needed."""
+        if self._trained:
+            return
+        with self._lock:
+            if self._trained:
+                return
+            db_file = self.db_file or logger.DB_FILE
+            rows = []
+            if os.path.exists(db_file):
+                try:
+                    with sqlite3.connect(db_file) as conn:
+                        rows = conn.execute(
+                            f"SELECT payload FROM {logger.LOG_TABLE_NAME} WHERE kind = 'planner_ok' ORDER BY id DESC LIMIT ?",
+                            (self.training_events,)
+                        ).fetchall()
+                except sqlite3.Error as e:
+                    log_event("router_training_failed", {"error": str(e)})
+            for (payload,) in reversed(rows):
+                event = json.loads(payload)
+                if event.get("request") and isinstance(event.get("plan"), dict):
+                    self._learn(event["request"], event["plan"], event.get("standalone", False))
+            self._trained = True
+            log_event("router_trained", {"samples": self.model.samples, "templates": len(self.templates())})
+
+    def _learn(self, request: str, plan: dict, standalone: bool):
+        steps = plan.get("steps") or []
+        self.model.learn(request, _LABEL_STEPS if steps else _LABEL_EMPTY)
+        if not standalone:
+            return
+        key = normalize_request(request)
+        plan_json = json.dumps(plan, sort_keys=True)
+        entry = self._templates.get(key)
+        if entry is not None and entry[0] == plan_json:
+            entry[1] += 1
+        else:
+            self._templates[key] = [plan_json, 1]
+
+    def learn(self, request: str, plan: dict, plan_ms: float = None, standalone: bool = False):
+        """Adds a planner result to the model, to the templates if it was planned without earlier turns, and to
+        the running planner latency."""
+        self._ensure_trained()
+        with self._lock:
+            self._learn(request, plan, standalone)
+            if plan_ms is not None:
+                self._plan_ms = plan_ms if self._plan_ms is None else 0.9 * self._plan_ms + 0.1 * plan_ms
+
+    def templates(self):
+        return {key: entry[0] for key, entry in self._templates.items() if entry[1] >= ROUTER_TEMPLATE_MIN_COUNT}
+
+    def route(self, user_input: str, available_agents: list, available_tools: list,
+              standalone: bool = False) -> RouteDecision:
+        """Decides how to run a turn; templates are only considered for a `standalone` turn (no earlier turns)."""
+        started = time.perf_counter()
+        self._ensure_trained()
+        decision = self._decide(user_input, available_agents, available_tools, standalone)
+        log_event("route_decision", {
+            "request": user_input, "route": decision.route, "reason": decision.reason,
+            "confidence": round(decision.confidence, 4), "decision_ms": round((time.perf_counter() - started) * 1000, 3),
+            "est_saved_ms": round(self._plan_ms, 1) if decision.route != ROUTE_PLANNER and self._plan_ms else None
+        })
+        return decision
+
+    def _decide(self, user_input: str, available_agents: list, available_tools: list,
+                standalone: bool) -> RouteDecision:
+        if _CONVERSATIONAL.match(user_input):
+            return RouteDecision(ROUTE_CONVERSATIONAL, {"steps": []}, "rule")
+
+        with self._lock:
+            entry = self._templates.get(normalize_request(user_input)) if standalone else None
+            template = entry[0] if entry is not None and entry[1] >= ROUTER_TEMPLATE_MIN_COUNT else None
+            label, confidence = self.model.predict(user_input)
+            # A model that has only seen one outcome is sure of everything.
+            trained = self.model.samples >= ROUTER_MIN_SAMPLES and len(self.model.class_counts) > 1
+        if template is not None:
+            plan = json.loads(template)
+            if not plan["steps"]:
+                return RouteDecision(ROUTE_CONVERSATIONAL, plan, "template")
+            if not validate_plan(plan, available_agents, available_tools):
+                return RouteDecision(ROUTE_TEMPLATE, plan, "template")
+
+        if trained and label == _LABEL_EMPTY and confidence >= ROUTER_CONFIDENCE:
+            return RouteDecision(ROUTE_CONVERSATIONAL, {"steps": []}, "model", confidence)
+        return RouteDecision(ROUTE_PLANNER, reason="default", confidence=confidence if label == _LABEL_STEPS else 1.0)
+
+    def maybe_audit(self, decision: RouteDecision, user_input: str, build_context, available_agents: list,
+                    available_tools: list, standalone: bool = False):
+        """For a sampled share of fast-pathed turns, runs the planner in the background and logs whether it agreed.
+
+        `build_context` returns the planner input; it is only called for audited turns, on the caller's thread,
+        because it reads the turn's history and context builder.
+        """
+        if decision.route == ROUTE_PLANNER or not ROUTER_SHADOW_RATE or random.random() >= ROUTER_SHADOW_RATE:
+            return
+        planner_input = build_context()
+
+        def audit():
+            try:
+                plan = plan_with_retry(planner_input, available_agents, available_tools, request=user_input,
+                                       standalone=standalone)
+            except Exception as e:
+                log_event("route_audit", {"request": user_input, "route": decision.route, "error": str(e)})
+                return
+            agreed = json.dumps(plan.get("steps", []), sort_keys=True) == json.dumps(decision.plan["steps"], sort_keys=True)
+            log_event("route_audit", {"request": user_input, "route": decision.route, "reason": decision.reason,
+                                      "agreed": agreed})
+
+        threading.Thread(target=audit, name="route-audit", daemon=True).start()
+
+
+router = Router()
+
+
+def print_report(db_file: str = None):
+    """Prints decision counts per route and reason, estimated planner time saved, and audit agreement."""
+    db_file = db_file or logger.DB_FILE
+    if not os.path.exists(db_file):
+        print(f"No log database at {db_file}.")
+        return
+    with sqlite3.connect(db_file) as conn:
+        decisions = [json.loads(row[0]) for row in conn.execute(
+            f"SELECT payload FROM {logger.LOG_TABLE_NAME} WHERE kind = 'route_decision'")]
+        audits = [json.loads(row[0]) for row in conn.execute(
+            f"SELECT payload FROM {logger.LOG_TABLE_NAME} WHERE kind = 'route_audit'")]
+    if not decisions:
+        print("No routing decisions logged yet.")
+        return
+
+    counts = Counter((d["route"], d["reason"]) for d in decisions)
+    print(f"{len(decisions)} decisions, mean decision time "
+          f"{sum(d['decision_ms'] for d in decisions) / len(decisions):.3f} ms")
+    for (route, reason), count in sorted(counts.items()):
+        print(f"  {route:15s} {reason:9s} {count:6d}  {100 * count / len(decisions):5.1f}%")
+    saved = sum(d["est_saved_ms"] or 0 for d in decisions)
+    print(f"estimated planner time saved: {saved / 1000:.1f} s")
+    checked = [a for a in audits if "agreed" in a]
+    if checked:
+        agreed = sum(1 for a in checked if a["agreed"])
+        print(f"shadow audits: {agreed}/{len(checked)} agreed with the planner ({100 * agreed / len(checked):.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shows how turns were routed.")
+    parser.add_argument("--db", default=None, help=f"Log database (default {logger.DB_FILE}).")
+    args = parser.parse_args(argv)
+    print_report(args.db)
+
+
+if __name__ == "__main__":
+    main()
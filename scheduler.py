@@ -0,0 +1,216 @@
+"""Admission control for provider calls.
+
+Every LLM request takes a slot from `llm_scheduler` first. A slot is granted when the process-wide
+concurrency cap and the request/token buckets of both its provider and its model (LLM_RATE_LIMITS) allow it.
+Waiting calls are served by priority class, then round-robin across sessions, so one busy conversation
+cannot starve the others and user-facing calls go ahead of background agent steps.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from config import LLM_MAX_INFLIGHT_CALLS, LLM_RATE_LIMITS, LLM_SCHEDULER_STATS_INTERVAL_SEC
+from logger import log_event
+
+PRIORITY_CRITICAL = "critical"
+PRIORITY_BACKGROUND = "background"
+PRIORITIES = (PRIORITY_CRITICAL, PRIORITY_BACKGROUND)
+# A bucket holds this many seconds of its per-minute budget, which bounds bursts.
+BURST_SEC = 10
+
+_session = contextvars.ContextVar("llm_session", default="default")
+
+
+@contextmanager
+def session(session_id: str):
+    """Attributes the LLM calls made in this context to `session_id` for fair queueing."""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    """Rough prompt size (4 chars per token) plus the completion budget; settled against real usage later."""
+    chars = 0
+    for message in messages:
+        content = message.get("content", "")
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content))
+    return chars // 4 + max_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SEC)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken. A full bucket admits any amount, so large requests still run."""
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def adjust(self, amount: float):
+        """Takes (negative) or returns (positive) tokens; the level may go negative and is repaid by refill."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("provider", "model", "tokens", "priority", "session", "enqueued", "granted")
+
+    def __init__(self, provider: str, model: str, tokens: int, priority: str, session_id: str):
+        self.provider = provider
+        self.model = model
+        self.tokens = tokens
+        self.priority = priority
+        self.session = session_id
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class Ticket:
+    """A granted slot. Set `used_tokens` once the provider reports usage so the token buckets are corrected."""
+    __slots__ = ("provider", "model", "tokens", "wait_sec", "used_tokens")
+
+    def __init__(self, provider: str, model: str, tokens: int, wait_sec: float):
+        self.provider = provider
+        self.model = model
+        self.tokens = tokens
+        self.wait_sec = wait_sec
+        self.used_tokens = None
+
+
+class LLMScheduler:
+    def __init__(self, max_inflight: int = LLM_MAX_INFLIGHT_CALLS, limits: dict = None):
+        self.max_inflight = max_inflight
+        self.limits = LLM_RATE_LIMITS if limits is None else limits
+        self._buckets = {}
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._inflight = 0
+        self._wakeup_at = None
+        self._cond = threading.Condition()
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+        self._granted = {priority: 0 for priority in PRIORITIES}
+        self._last_published = time.monotonic()
+
+    def _buckets_for(self, provider: str, model: str):
+        buckets = []
+        for key in (provider, model):
+            limits = self.limits.get(key) or {}
+            for kind in ("rpm", "tpm"):
+                if limits.get(kind):
+                    bucket = self._buckets.get((key, kind))
+                    if bucket is None:
+                        bucket = self._buckets[(key, kind)] = TokenBucket(limits[kind])
+                    buckets.append((kind, bucket))
+        return buckets
+
+    def _dispatch(self):
+        """Grants every waiter that can run now. Called with the lock held."""
+        now = time.monotonic()
+        wakeup_at = None
+        blocked = set()
+        granted = False
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            progress = True
+            while progress and queue and self._inflight < self.max_inflight:
+                progress = False
+                # One grant per session per pass, then the session goes to the back of the line.
+                for session_id in list(queue):
+                    if self._inflight >= self.max_inflight:
+                        break
+                    waiters = queue[session_id]
+                    waiter = waiters[0]
+                    # Earlier (or higher priority) waiters for the same model keep their place.
+                    if (waiter.provider, waiter.model) in blocked:
+                        continue
+                    buckets = self._buckets_for(waiter.provider, waiter.model)
+                    delay = max((bucket.wait_time(waiter.tokens if kind == "tpm" else 1, now) for kind, bucket in buckets),
+                                default=0.0)
+                    if delay > 0:
+                        blocked.add((waiter.provider, waiter.model))
+                        wakeup_at = now + delay if wakeup_at is None else min(wakeup_at, now + delay)
+                        continue
+                    for kind, bucket in buckets:
+                        bucket.adjust(-(waiter.tokens if kind == "tpm" else 1))
+                    waiters.popleft()
+                    if waiters:
+                        queue.move_to_end(session_id)
+                    else:
+                        del queue[session_id]
+                    waiter.granted = True
+                    self._inflight += 1
+                    granted = progress = True
+        if granted or wakeup_at != self._wakeup_at:
+            self._wakeup_at = wakeup_at
+            self._cond.notify_all()
+
+    def acquire(self, provider: str, model: str, tokens: int, priority: str = PRIORITY_BACKGROUND) -> Ticket:
+        """Blocks until the call may be sent."""
+        waiter = _Waiter(provider, model, tokens, priority, _session.get())
+        with self._cond:
+            self._queues[priority].setdefault(waiter.session, deque()).append(waiter)
+            self._dispatch()
+            while not waiter.granted:
+                timeout = None if self._wakeup_at is None else max(0.0, self._wakeup_at - time.monotonic())
+                self._cond.wait(timeout)
+                if not waiter.granted and self._wakeup_at is not None and time.monotonic() >= self._wakeup_at:
+                    self._dispatch()
+            wait_sec = time.monotonic() - waiter.enqueued
+            self._waits[priority].append(wait_sec)
+            self._granted[priority] += 1
+        return Ticket(provider, model, tokens, wait_sec)
+
+    def release(self, ticket: Ticket):
+        with self._cond:
+            self._inflight -= 1
+            if ticket.used_tokens is not None and ticket.used_tokens != ticket.tokens:
+                for kind, bucket in self._buckets_for(ticket.provider, ticket.model):
+                    if kind == "tpm":
+                        bucket.adjust(ticket.tokens - ticket.used_tokens)
+            self._dispatch()
+            now = time.monotonic()
+            publish = now - self._last_published >= LLM_SCHEDULER_STATS_INTERVAL_SEC
+            if publish:
+                self._last_published = now
+        if publish:
+            log_event("llm_scheduler_stats", self.stats())
+
+    @contextmanager
+    def slot(self, provider: str, model: str, tokens: int, priority: str = PRIORITY_BACKGROUND):
+        ticket = self.acquire(provider, model, tokens, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Queue depth per priority, calls in flight, and recent slot wait times in milliseconds."""
+        with self._cond:
+            queued = {priority: sum(len(waiters) for waiters in self._queues[priority].values()) for priority in PRIORITIES}
+            sessions = set()
+            for priority in PRIORITIES:
+                sessions.update(self._queues[priority])
+            waits = {priority: sorted(self._waits[priority]) for priority in PRIORITIES}
+            stats = {"inflight": self._inflight, "queued": queued, "sessions_waiting": len(sessions),
+                     "granted": dict(self._granted), "wait_ms": {}}
+        for priority, samples in waits.items():
+            if samples:
+                stats["wait_ms"][priority] = {
+                    "p50": round(samples[len(samples) // 2] * 1000, 2),
+                    "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                    "max": round(samples[-1] * 1000, 2),
+                }
+        return stats
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from loader import build_registry, discover_tools
+from pipeline import run_turn
+from scheduler import llm_scheduler
+from history_manager import ConversationHistory, PlannerContextBuilder
+from memory import init_db, memory_store
+from logger import log_event, init_log_db, shutdown_logger
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SESSION_IDLE_TIMEOUT_SEC
+
+MAX_BODY_BYTES = 1024 * 1024
+SWEEP_INTERVAL_SEC = 30.0
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+
+
+class SessionDeleted(Exception):
+    """A turn was waiting on a session that has since been deleted."""
+
+
+class Session:
+    """One conversation: its own history and context cache. Turns within a session run one at a time.
+
+    History is persisted, so a session id from before a restart or an eviction picks up where it left off.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history = ConversationHistory(session_id)
+        self.context_builder = PlannerContextBuilder()
+        self.lock = asyncio.Lock()
+        # Set when the session is deleted or the server closes, to kill the running turn's isolated tools.
+        self.cancel_event = threading.Event()
+        self.last_active = time.monotonic()
+
+
+class AgentServer:
+    """Serves the planner -> executor -> responder pipeline to many concurrent sessions over HTTP/1.1 + JSON.
+
+    Endpoints:
+      POST   /sessions                  -> {"session_id"}
+      POST   /sessions/{id}/turns       {"input": "..."} -> {"session_id", "response"}
+      DELETE /sessions/{id}
+      GET    /health
+    Turns run on a bounded thread pool; concurrent LLM calls are capped in llm_client.
+    """
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT_SEC, registry=None, available_tools: list = None):
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.registry = registry or build_registry()
+        self.available_tools = available_tools if available_tools is not None else discover_tools()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="turn")
+        self._sessions = {}
+        # Deleted sessions whose turn is still running; a new session with the same id waits for it.
+        self._closing = {}
+        self._server = None
+        self._sweeper = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep_idle())
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        print(f"Serving on http://{self.host}:{self.port}")
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in self._sessions.values():
+            session.cancel_event.set()
+        self._executor.shutdown(wait=True)
+
+    def _session(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session(session_id)
+            log_event("session_started", {"session_id": session_id, "active_sessions": len(self._sessions)})
+        return session
+
+    async def run_turn(self, session_id: str, user_input: str):
+        closing = self._closing.get(session_id)
+        if closing is not None:
+            # Let the deleted session's turn finish before its history is resumed under the same id.
+            async with closing.lock:
+                pass
+        session = self._session(session_id)
+        async with session.lock:
+            if session.cancel_event.is_set():
+                raise SessionDeleted(session_id)
+            session.last_active = time.monotonic()
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor, functools.partial(
+                    run_turn, user_input, session.history, self.registry, self.available_tools,
+                    source="server", context_builder=session.context_builder, session_id=session_id,
+                    cancel_event=session.cancel_event
+                ))
+            finally:
+                session.last_active = time.monotonic()
+                if self._closing.get(session_id) is session:
+                    del self._closing[session_id]
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if not session.lock.locked() and now - session.last_active > self.idle_timeout:
+                del self._sessions[session_id]
+                log_event("session_evicted", {"session_id": session_id, "turns": len(session.history),
+                                              "active_sessions": len(self._sessions)})
+
+    async def _sweep_idle(self):
+        while True:
+            await asyncio.sleep(min(SWEEP_INTERVAL_SEC, self.idle_timeout))
+            self.evict_idle()
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            return 200, {"status": "ok", "active_sessions": len(self._sessions), "llm_scheduler": llm_scheduler.stats()}
+        if method == "POST" and parts == ["sessions"]:
+            session = self._session(uuid.uuid4().hex)
+            return 201, {"session_id": session.session_id}
+        if method == "DELETE" and len(parts) == 2 and parts[0] == "sessions":
+            session = self._sessions.pop(parts[1], None)
+            if session is None:
+                return 404, {"error": "Unknown session."}
+            session.cancel_event.set()
+            if session.lock.locked():
+                self._closing[parts[1]] = session
+            return 200, {"session_id": parts[1]}
+        if method == "POST" and len(parts) == 3 and parts[0] == "sessions" and parts[2] == "turns":
+            try:
+                user_input = str(json.loads(body or b"{}").get("input", "")).strip()
+            except (ValueError, AttributeError):
+                return 400, {"error": "Body must be a JSON object."}
+            if not user_input:
+                return 400, {"error": "Missing 'input'."}
+            try:
+                response = await self.run_turn(parts[1], user_input)
+            except SessionDeleted:
+                return 404, {"error": "Session was deleted."}
+            except Exception as e:
+                log_event("server_turn_failed", {"session_id": parts[1], "error": str(e)})
+                return 500, {"error": str(e)}
+            return 200, {"session_id": parts[1], "response": response}
+        return 404, {"error": "Not found."}
+
+    @staticmethod
+    async def _read_request(reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError as e:
+                    request, status, payload = None, 413 if "too large" in str(e) else 400, {"error": str(e)}
+                    keep_alive = False
+                else:
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    status, payload = await self._dispatch(method, path, body)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    init_db()
+    init_log_db()
+    server = AgentServer()
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+        log_event(kind="server_stop", payload={"reason": "user_interrupt"})
+    finally:
+        memory_store.close()
+        shutdown_logger()
+
+if __name__ == "__main__":
+    main()
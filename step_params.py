@@ -0,0 +1,180 @@
+"""Step parameters compiled once per plan, with step results passed by handle.
+
+`compile_params` walks a step's params once and records where `{step_id}` placeholders sit, so filling
+them in is a walk over precomputed parts instead of a regex pass per string per step. Constant subtrees
+are shared, not rebuilt.
+
+Tool steps get the step results themselves. Agent steps get a `ResultHandle` wherever a result goes:
+the handle is shared by every step of the run that reads the same result, and it is turned into text
+once, cut to PROMPT_RESULT_MAX_CHARS, when a prompt is built. A multi-megabyte tool output is therefore
+never copied into params, and is rendered at most once however many agents read it.
+"""
+import json
+import re
+
+from config import PROMPT_RESULT_MAX_CHARS
+
+_PLACEHOLDER = re.compile(r"\{([a-zA-Z0-9_]+)\}")
+
+_CONST, _REF, _TEXT, _DICT, _LIST = range(5)
+
+
+def render_result(value, max_chars: int = PROMPT_RESULT_MAX_CHARS) -> str:
+    """Prompt text for a step result: strings as they are, anything else as JSON, cut to `max_chars`.
+
+    Non-string values are encoded incrementally and encoding stops at the cap, so a huge result is never
+    serialized in full.
+    """
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}... [truncated, {len(value) - max_chars} more characters]"
+    parts, size = [], 0
+    for chunk in json.JSONEncoder(default=str, ensure_ascii=False).iterencode(value):
+        parts.append(chunk)
+        size += len(chunk)
+        if size > max_chars:
+            return f"{''.join(parts)[:max_chars]}... [truncated]"
+    return "".join(parts)
+
+
+class ResultHandle:
+    """A step result referenced from agent params; rendered to capped text on first use."""
+    __slots__ = ("step_id", "value", "_text")
+
+    def __init__(self, step_id: str, value):
+        self.step_id = step_id
+        self.value = value
+        self._text = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = render_result(self.value)
+        return self._text
+
+    def prompt_value(self):
+        """What params_to_prompt encodes: a structured result that fits the cap stays structured."""
+        text = self.text()
+        if isinstance(self.value, str) or len(text) > PROMPT_RESULT_MAX_CHARS:
+            return text
+        return self.value
+
+
+class _Text:
+    """A string with results embedded in it; parts are literals and handles."""
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: list):
+        self.parts = parts
+
+    def text(self) -> str:
+        return "".join(part if isinstance(part, str) else part.text() for part in self.parts)
+
+
+def _compile(value):
+    if isinstance(value, dict):
+        nodes = [(key, _compile(item)) for key, item in value.items()]
+        if all(node[0] == _CONST for _, node in nodes):
+            return _CONST, value
+        return _DICT, nodes
+    if isinstance(value, list):
+        nodes = [_compile(item) for item in value]
+        if all(node[0] == _CONST for node in nodes):
+            return _CONST, value
+        return _LIST, nodes
+    if isinstance(value, str):
+        whole = _PLACEHOLDER.fullmatch(value)
+        if whole:
+            return _REF, whole.group(1)
+        parts, position = [], 0
+        for match in _PLACEHOLDER.finditer(value):
+            if match.start() > position:
+                parts.append(value[position:match.start()])
+            parts.append((match.group(1), match.group(0)))
+            position = match.end()
+        if not parts:
+            return _CONST, value
+        if position < len(value):
+            parts.append(value[position:])
+        return _TEXT, parts
+    return _CONST, value
+
+
+class CompiledParams:
+    """A step's params with placeholder positions precomputed. `refs` lists every step id they mention."""
+    __slots__ = ("_tree", "refs")
+
+    def __init__(self, params):
+        self._tree = _compile(params)
+        self.refs = set()
+        self._collect_refs(self._tree)
+
+    def _collect_refs(self, node):
+        kind, value = node
+        if kind == _REF:
+            self.refs.add(value)
+        elif kind == _TEXT:
+            self.refs.update(part[0] for part in value if not isinstance(part, str))
+        elif kind == _DICT:
+            for _, child in value:
+                self._collect_refs(child)
+        elif kind == _LIST:
+            for child in value:
+                self._collect_refs(child)
+
+    def render(self, results: dict, handles: dict = None):
+        """Fills placeholders from `results`; unknown step ids stay as written.
+
+        Without `handles` results are inserted as values (whole-string placeholders keep their type, embedded
+        ones are joined as text), as tool steps need. With a `handles` dict, shared across the steps of one
+        run, results are inserted as ResultHandles for agent prompts.
+        """
+        return self._render(self._tree, results, handles)
+
+    def _render(self, node, results: dict, handles):
+        kind, value = node
+        if kind == _CONST:
+            return value
+        if kind == _DICT:
+            return {key: self._render(child, results, handles) for key, child in value}
+        if kind == _LIST:
+            return [self._render(child, results, handles) for child in value]
+        if kind == _REF:
+            if value not in results:
+                return "{" + value + "}"
+            return results[value] if handles is None else _handle(value, results, handles)
+        parts = []
+        for part in value:
+            if isinstance(part, str):
+                parts.append(part)
+            elif part[0] not in results:
+                parts.append(part[1])
+            elif handles is None:
+                parts.append(str(results[part[0]]))
+            else:
+                parts.append(_handle(part[0], results, handles))
+        if handles is None or all(isinstance(part, str) for part in parts):
+            return "".join(parts)
+        return _Text(parts)
+
+
+def _handle(step_id: str, results: dict, handles: dict) -> ResultHandle:
+    handle = handles.get(step_id)
+    if handle is None:
+        handle = handles[step_id] = ResultHandle(step_id, results[step_id])
+    return handle
+
+
+def compile_params(params) -> CompiledParams:
+    return CompiledParams(params)
+
+def _prompt_default(value):
+    if isinstance(value, ResultHandle):
+        return value.prompt_value()
+    if isinstance(value, _Text):
+        return value.text()
+    return str(value)
+
+def params_to_prompt(params) -> str:
+    """The JSON an agent prompt shows for `params`, with every result handle rendered as capped text."""
+    return json.dumps(params, indent=2, default=_prompt_default)
@@ -0,0 +1,80 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import TOOL_CACHE_MAX_ITEMS
+
+STATIC = "static"
+NEVER = "never"
+
+
+def freshness_ttl(freshness):
+    """Maps a tool's declared freshness to a TTL in seconds: None for static, 0 for never cache."""
+    if freshness == STATIC:
+        return None
+    if isinstance(freshness, (int, float)) and not isinstance(freshness, bool) and freshness > 0:
+        return float(freshness)
+    return 0
+
+
+class ToolCache:
+    """Memoizes tool results keyed on (tool_name, params) according to each tool's freshness policy.
+
+    Results are copied in and out, so a caller that mutates its result cannot change later hits. At most
+    `max_items` results are kept; the least recently used is dropped first.
+    """
+
+    def __init__(self, max_items: int = TOOL_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.saved_sec = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(tool_name: str, params: dict):
+        return tool_name, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, tool_name: str, params: dict, freshness, version=None):
+        """Returns (hit, result, elapsed_sec) where elapsed_sec is the run time the hit avoided.
+
+        Entries stored under a different `version` (e.g. before the tool was reloaded) are misses.
+        """
+        if freshness_ttl(freshness) == 0:
+            return False, None, 0.0
+        key = self._key(tool_name, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result, elapsed, entry_version = entry
+                if entry_version == version and (expires_at is None or now < expires_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_sec += elapsed
+                    return True, copy.deepcopy(result), elapsed
+                del self._entries[key]
+            self.misses += 1
+            return False, None, 0.0
+
+    def put(self, tool_name: str, params: dict, freshness, result, elapsed: float, version=None):
+        ttl = freshness_ttl(freshness)
+        if ttl == 0:
+            return
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        result = copy.deepcopy(result)
+        key = self._key(tool_name, params)
+        with self._lock:
+            self._entries[key] = (expires_at, result, elapsed, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "saved_sec": round(self.saved_sec, 6)}
+
+
+tool_cache = ToolCache()
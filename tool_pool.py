@@ -0,0 +1,153 @@
+import atexit
+import importlib.util
+import multiprocessing
+import os
+import threading
+import time
+
+import tracing
+
+POLL_INTERVAL_SEC = 0.05
+
+
+def module_name_of(module_path: str) -> str:
+    return os.path.splitext(os.path.basename(module_path))[0]
+
+
+def _worker_main(conn):
+    """Worker process loop: runs one tool call per request until told to stop."""
+    loaded = {}
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if request is None:
+            return
+        module_path, tool_name, mtime, params = request
+        try:
+            entry = loaded.get(module_path)
+            if entry is None or entry[0] != mtime:
+                package = os.path.basename(os.path.dirname(module_path))
+                spec = importlib.util.spec_from_file_location(f"{package}.{module_name_of(module_path)}", module_path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                entry = loaded[module_path] = (mtime, module)
+            module = entry[1]
+            if tool_name is None:
+                # A metadata request: the tool's get_info(), as Registry._load_tool reads it.
+                get_info = getattr(module, "get_info", None)
+                conn.send(("ok", get_info() if callable(get_info) else {"name": module_name_of(module_path)}))
+            else:
+                conn.send(("ok", getattr(module, tool_name)(**params)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class ToolWorkerPool:
+    """Reusable worker processes for tool calls, with per-call timeouts and cancellation.
+
+    At most `max_workers` calls run at once; further callers wait for a free worker. A worker
+    whose call times out, is cancelled or crashes is killed and replaced on the next call.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+        return _Worker(self._ctx)
+
+    def _checkin(self, worker):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+                return
+        worker.conn.send(None)
+
+    def run(self, module_path: str, tool_name: str, mtime, params: dict, timeout: float = None, cancel_event=None):
+        """Runs a tool in a worker. Returns (status, payload) where status is "ok", "error",
+        "timeout", "cancelled" or "crashed" and payload is the result or an error message."""
+        queued = time.perf_counter()
+        while not self._slots.acquire(timeout=POLL_INTERVAL_SEC):
+            if cancel_event is not None and cancel_event.is_set():
+                return "cancelled", "cancelled before a worker was available"
+        tracing.current_span().add_queue_time(time.perf_counter() - queued)
+        try:
+            worker = self._checkout()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                worker.conn.send((module_path, tool_name, mtime, params))
+                while True:
+                    wait = POLL_INTERVAL_SEC if deadline is None else max(0.0, min(POLL_INTERVAL_SEC, deadline - time.monotonic()))
+                    if worker.conn.poll(wait):
+                        status, payload = worker.conn.recv()
+                        self._checkin(worker)
+                        return status, payload
+                    if not worker.process.is_alive():
+                        worker.kill()
+                        return "crashed", f"worker exited with code {worker.process.exitcode}"
+                    if cancel_event is not None and cancel_event.is_set():
+                        worker.kill()
+                        return "cancelled", "cancelled while running"
+                    if deadline is not None and time.monotonic() >= deadline:
+                        worker.kill()
+                        return "timeout", f"timed out after {timeout}s"
+            except (EOFError, OSError):
+                worker.kill()
+                return "crashed", f"worker exited with code {worker.process.exitcode}"
+        finally:
+            self._slots.release()
+
+    def info(self, module_path: str, mtime, timeout: float = None, cancel_event=None):
+        """Reads a tool's get_info() in a worker, so the caller never imports the tool. Same return as run()."""
+        return self.run(module_path, None, mtime, {}, timeout=timeout, cancel_event=cancel_event)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            try:
+                worker.conn.send(None)
+                worker.process.join(1)
+            except OSError:
+                pass
+            if worker.process.is_alive():
+                worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_tool_pool(max_workers: int) -> ToolWorkerPool:
+    """Process-wide pool, created on first use and shut down at exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ToolWorkerPool(max_workers)
+            atexit.register(_pool.shutdown)
+        return _pool
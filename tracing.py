@@ -0,0 +1,245 @@
+"""Per-turn tracing: a turn id plus nested spans, exported to SQLite through the log writer.
+
+    with tracing.turn(source="cli"):
+        with tracing.span("plan") as span:
+            span.add_retry()
+
+Run `python tracing.py` to see where the most recent turns spent their time.
+"""
+import argparse
+import contextvars
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+import logger
+from config import TRACING_ENABLED
+
+_turn_id = contextvars.ContextVar("trace_turn_id", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_collector = contextvars.ContextVar("trace_collector", default=None)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "turn_id", "name", "start_ts", "wall_ms", "queue_ms", "retries",
+                 "input_tokens", "output_tokens", "status", "attrs", "_started", "_finished")
+
+    def __init__(self, name: str, turn_id=None, parent_id=None, attrs: dict = None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.turn_id = turn_id
+        self.name = name
+        self.start_ts = time.time()
+        self.wall_ms = 0.0
+        self.queue_ms = 0.0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.status = "ok"
+        self.attrs = dict(attrs or {})
+        self._started = time.perf_counter()
+        self._finished = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_queue_time(self, seconds: float):
+        self.queue_ms += seconds * 1000
+
+    def add_retry(self, count: int = 1):
+        self.retries += count
+
+    def add_usage(self, input_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0):
+        self.input_tokens += input_tokens or 0
+        self.output_tokens += output_tokens or 0
+        if cached_tokens:
+            self.attrs["cached_tokens"] = self.attrs.get("cached_tokens", 0) + cached_tokens
+
+    def fail(self, error):
+        self.status = "error"
+        self.attrs["error"] = str(error)[:300]
+
+    def finish(self):
+        """Records the wall time and queues the span for export. Later calls are ignored."""
+        if self._finished:
+            return
+        self._finished = True
+        self.wall_ms = (time.perf_counter() - self._started) * 1000
+        logger.log_span(self.row())
+        collector = _collector.get()
+        if collector is not None:
+            collector.append(self)
+
+    def row(self):
+        return (self.span_id, self.parent_id, self.turn_id, self.name, self.start_ts, round(self.wall_ms, 3),
+                round(self.queue_ms, 3), self.retries, self.input_tokens, self.output_tokens, self.status,
+                json.dumps(self.attrs, default=str))
+
+
+class _NullSpan:
+    """Stands in for a span when tracing is disabled, so call sites need no checks."""
+    span_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def add_queue_time(self, seconds: float):
+        pass
+
+    def add_retry(self, count: int = 1):
+        pass
+
+    def add_usage(self, input_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def finish(self):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+
+def current_turn_id():
+    return _turn_id.get()
+
+def current_span():
+    """The innermost open span of this context, or a no-op span."""
+    return _current_span.get() or _NULL_SPAN
+
+def start_span(name: str, **attrs):
+    """Opens a child of the current span without making it current; the caller must call finish().
+
+    Used where a `with` block cannot wrap the work, e.g. inside a generator that may be closed elsewhere.
+    """
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    parent = _current_span.get()
+    return Span(name, _turn_id.get(), parent.span_id if parent else None, attrs)
+
+@contextmanager
+def span(name: str, **attrs):
+    """Opens a child of the current span and makes it current for the duration of the block."""
+    trace_span = start_span(name, **attrs)
+    if trace_span is _NULL_SPAN:
+        yield trace_span
+        return
+    token = _current_span.set(trace_span)
+    try:
+        yield trace_span
+    except BaseException as e:
+        trace_span.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace_span.finish()
+
+@contextmanager
+def collect():
+    """Also gathers the spans finished in this context, including executor steps, into the yielded list."""
+    spans = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+@contextmanager
+def turn(turn_id: str = None, **attrs):
+    """Starts a new turn id and its root span."""
+    turn_token = _turn_id.set(turn_id or uuid.uuid4().hex)
+    span_token = _current_span.set(None)
+    try:
+        with span("turn", **attrs) as trace_span:
+            yield trace_span
+    finally:
+        _current_span.reset(span_token)
+        _turn_id.reset(turn_token)
+
+
+def _load_turns(conn, limit: int, turn_id: str = None):
+    if turn_id:
+        turn_ids = [turn_id]
+    else:
+        turn_ids = [row[0] for row in conn.execute(
+            f"SELECT turn_id FROM {logger.SPAN_TABLE_NAME} WHERE name = 'turn' ORDER BY start_ts DESC LIMIT ?",
+            (limit,)
+        )]
+    turns = []
+    for tid in reversed(turn_ids):
+        rows = conn.execute(
+            f"""SELECT span_id, parent_id, name, start_ts, wall_ms, queue_ms, retries, input_tokens, output_tokens,
+                       status, attrs
+                FROM {logger.SPAN_TABLE_NAME} WHERE turn_id = ? ORDER BY start_ts""",
+            (tid,)
+        ).fetchall()
+        turns.append((tid, [dict(zip(("span_id", "parent_id", "name", "start_ts", "wall_ms", "queue_ms", "retries",
+                                      "input_tokens", "output_tokens", "status", "attrs"), row)) for row in rows]))
+    return turns
+
+def _describe(span_row: dict):
+    attrs = json.loads(span_row["attrs"])
+    parts = []
+    if span_row["queue_ms"] >= 0.05:
+        parts.append(f"queue {span_row['queue_ms']:.1f} ms")
+    if span_row["retries"]:
+        parts.append(f"retries {span_row['retries']}")
+    if span_row["input_tokens"] or span_row["output_tokens"]:
+        parts.append(f"tokens {span_row['input_tokens']}/{span_row['output_tokens']}")
+    for key in ("model", "cache", "cached_tokens", "ttft_ms", "steps", "fused", "llm_calls_saved"):
+        if key in attrs:
+            parts.append(f"{key}={attrs[key]}")
+    if span_row["status"] != "ok":
+        parts.append(f"{span_row['status'].upper()}: {attrs.get('error', '')}")
+    return "  ".join(parts)
+
+def print_report(db_file: str = None, limit: int = 5, turn_id: str = None):
+    """Prints each turn's span tree with the share of the turn's wall time spent in every span."""
+    db_file = db_file or logger.DB_FILE
+    if not os.path.exists(db_file):
+        print(f"No trace database at {db_file}.")
+        return
+    with sqlite3.connect(db_file) as conn:
+        logger._create_table(conn)
+        turns = _load_turns(conn, limit, turn_id)
+    if not turns:
+        print("No traced turns yet.")
+        return
+
+    for tid, spans in turns:
+        children = {}
+        for span_row in spans:
+            children.setdefault(span_row["parent_id"], []).append(span_row)
+        span_ids = {span_row["span_id"] for span_row in spans}
+        roots = [span_row for span_row in spans if span_row["parent_id"] not in span_ids]
+        total_ms = sum(root["wall_ms"] for root in roots) or 1.0
+        input_tokens = sum(s["input_tokens"] for s in spans)
+        output_tokens = sum(s["output_tokens"] for s in spans)
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(spans[0]["start_ts"])) if spans else ""
+        print(f"\nturn {tid}  {started}  {total_ms:.1f} ms  tokens {input_tokens}/{output_tokens}")
+
+        def walk(span_row, depth):
+            label = "  " * depth + span_row["name"]
+            share = 100 * span_row["wall_ms"] / total_ms
+            print(f"  {label:40s} {span_row['wall_ms']:10.1f} ms {share:6.1f}%  {_describe(span_row)}")
+            for child in children.get(span_row["span_id"], []):
+                walk(child, depth + 1)
+
+        for root in roots:
+            walk(root, 0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shows where recent turns spent their time.")
+    parser.add_argument("--turns", type=int, default=5, help="Number of most recent turns to show.")
+    parser.add_argument("--turn", help="Show a single turn id.")
+    parser.add_argument("--db", default=None, help=f"Trace database (default {logger.DB_FILE}).")
+    args = parser.parse_args(argv)
+    print_report(args.db, args.turns, args.turn)
+
+
+if __name__ == "__main__":
+    main()